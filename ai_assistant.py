@@ -0,0 +1,372 @@
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+import analytics
+import storage
+
+# ==========================================
+# עוזר AI: הקשר מתומצת בתקציב טוקנים + מטמון מודל ותשובות
+# ==========================================
+DEFAULT_MODEL = "gemini-1.5-flash"
+TOKEN_BUDGET = int(os.environ.get("AI_TOKEN_BUDGET", "8000"))
+# הערכה שמרנית לטקסט עברי/מספרי - בלי תלות בטוקנייזר של המודל
+CHARS_PER_TOKEN = 3
+ANSWER_CACHE_SIZE = 256
+
+_lock = threading.Lock()
+_models = {}
+_answers = OrderedDict()
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def resolve_model(client, cache_key=None):
+    # list_models הוא קריאת רשת - פותרים פעם אחת לכל מפתח API ושומרים לכל התהליך
+    with _lock:
+        if cache_key in _models:
+            return _models[cache_key]
+    best_model = DEFAULT_MODEL
+    try:
+        for m in client.list_models():
+            if 'generateContent' in m.supported_generation_methods and 'gemini' in m.name.lower():
+                best_model = m.name
+                break
+    except Exception:
+        pass
+    with _lock:
+        _models[cache_key] = best_model
+    return best_model
+
+
+def normalize_question(question):
+    question = re.sub(r"\s+", " ", question).strip().casefold()
+    return question.rstrip("?!.؟ ")
+
+
+def _worker_summary(valid_df):
+    grouped = valid_df.groupby('שם עובד')
+    summary = grouped.agg(משמרות=('כניסה', 'size'),
+                          שעות=('סהכ שעות', 'sum'),
+                          ממוצע=('סהכ שעות', 'mean'),
+                          ראשונה=('כניסה', 'min'),
+                          אחרונה=('כניסה', 'max'))
+    names = valid_df['שם עובד']
+    summary['חריגות'] = (valid_df['סהכ שעות'] > storage.LONG_SHIFT_HOURS).groupby(names).sum()
+    summary['פתוחות'] = valid_df['יציאה'].isna().groupby(names).sum()
+    return summary.round(2)
+
+
+def _month_summary(valid_df):
+    table = valid_df.pivot_table(index='שם עובד', columns='חודש', values='סהכ שעות', aggfunc='sum', fill_value=0)
+    return table[sorted(table.columns, reverse=True)].round(2)
+
+
+def _mentioned_workers(valid_df, question):
+    names = valid_df['שם עובד'].unique()
+    return [w for w in names if w and re.search(rf"(?<!\w){re.escape(w)}(?!\w)", question)]
+
+
+def _relevant_rows(valid_df, workers, question):
+    # שורות גולמיות רק למה שהשאלה מזכירה: עובדים וחודשים (YYYY-MM), ובלי אזכור - הכי עדכניות
+    months = re.findall(r"\d{4}-\d{2}", question)
+    rows = valid_df
+    if workers:
+        rows = rows[rows['שם עובד'].isin(workers)]
+    if months:
+        rows = rows[rows['חודש'].isin(months)]
+    return rows
+
+
+def _fit_lines(lines, budget):
+    # כמה שורות ראשונות נכנסות בתקציב הטוקנים
+    block, used = [], 0
+    for line in lines:
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget:
+            break
+        block.append(line)
+        used += cost
+    return block, used
+
+
+# חלק התקציב של כל סעיף; מה שסעיף לא ניצל עובר לבא אחריו
+SECTION_SHARES = [0.35, 0.3, 1.0]
+OMITTED_LINE_TOKENS = 15
+
+
+def build_context(df, question, token_budget=TOKEN_BUDGET):
+    valid_df = df if 'חודש' in df.columns else analytics.add_calendar_columns(df)
+    if valid_df.empty:
+        return "אין משמרות במערכת."
+    workers = _mentioned_workers(valid_df, question)
+    scoped = valid_df[valid_df['שם עובד'].isin(workers)] if workers else valid_df
+    rows = _relevant_rows(valid_df, workers, question)
+    summary = _worker_summary(scoped)
+    months = _month_summary(scoped)
+    # (כותרת, פונקציית עיצוב לפי מספר שורות מקסימלי, מספר שורות כולל)
+    sections = [
+        ("סיכום לפי עובד", lambda limit: summary.head(limit).to_string(), len(summary)),
+        ("שעות לפי עובד וחודש", lambda limit: months.head(limit).to_string(), len(months)),
+        (f"משמרות רלוונטיות ({len(rows)} סה\"כ, מהחדשה לישנה)",
+         lambda limit: rows.nlargest(limit, 'datetime')[['שם עובד', 'כניסה', 'יציאה', 'סהכ שעות']].to_string(index=False),
+         len(rows)),
+    ]
+
+    parts, used = [], 0
+    for (title, render, total), share in zip(sections, SECTION_SHARES):
+        budget = int((token_budget - used) * share)
+        header = f"## {title}"
+        if total == 0 or budget <= estimate_tokens(header) + 1:
+            continue
+        # מעצבים רק כמה שורות שיכולות להיכנס - לפי רוחב שורה שנמדד על דגימה קטנה
+        sample = render(10).splitlines()
+        per_line = max(1, max(estimate_tokens(line) for line in sample))
+        limit = min(total, budget // per_line + 1)
+        lines = render(limit).splitlines()
+        table_header = len(lines) - limit
+        # משאירים מקום לשורת "הושמטו" כדי לא לחרוג מהתקציב
+        block, cost = _fit_lines([header] + lines, budget - OMITTED_LINE_TOKENS)
+        shown = len(block) - 1 - table_header
+        if shown <= 0:
+            continue
+        if shown < total:
+            block.append(f"... ({total - shown} שורות נוספות הושמטו)")
+            cost += estimate_tokens(block[-1]) + 1
+        parts.append("\n".join(block) + "\n")
+        used += cost
+    return "".join(parts)
+
+
+def ask(model, question, token_budget=TOKEN_BUDGET):
+    # מטמון לפי (גרסת נתונים, שאלה מנורמלת) - שאלה חוזרת על אותם נתונים לא עולה כלום
+    key = (storage.data_version(), normalize_question(question), token_budget)
+    with _lock:
+        if key in _answers:
+            _answers.move_to_end(key)
+            return _answers[key]
+    context = build_context(analytics.get_calendar(), question, token_budget)
+    res = model.generate_content(f"נתוני משמרות:\n{context}\nשאלה: {question}")
+    answer = res.text
+    with _lock:
+        _answers[key] = answer
+        while len(_answers) > ANSWER_CACHE_SIZE:
+            _answers.popitem(last=False)
+    return answer
+
+
+# ==========================================
+# מצב תוכנית שאילתה: המודל מקבל רק את הסכמה ומחזיר JSON, pandas מריץ מקומית
+# ==========================================
+QUERY_COLUMNS = {
+    "שם עובד": "שם העובד (טקסט)",
+    "כניסה": "זמן כניסה, טקסט בפורמט YYYY-MM-DD HH:MM",
+    "יציאה": "זמן יציאה, טקסט בפורמט YYYY-MM-DD HH:MM, ריק למשמרת פתוחה",
+    "סהכ שעות": "משך המשמרת בשעות (מספר)",
+    "תאריך יומי": "תאריך הכניסה, YYYY-MM-DD",
+    "חודש": "חודש הכניסה, YYYY-MM",
+    analytics.WEEK_COL: "יום ראשון של שבוע הכניסה, YYYY-MM-DD",
+    "יום בשבוע": "יום בשבוע: א' ב' ג' ד' ה' ו' ש'",
+}
+FILTER_OPS = {"==", "!=", ">", ">=", "<", "<=", "in", "between", "contains", "is_null", "not_null"}
+AGG_FUNCS = {"sum", "mean", "count", "min", "max", "nunique"}
+# סכום / ממוצע רק על עמודה מספרית - על טקסט pandas נכשל באמצע run_plan
+NUMERIC_FUNCS = {"sum", "mean"}
+NUMERIC_COLUMNS = {"סהכ שעות"}
+MAX_RESULT_ROWS = 500
+
+
+class QueryPlanError(ValueError):
+    pass
+
+
+def build_plan_prompt(question):
+    schema = "\n".join(f"- {col}: {desc}" for col, desc in QUERY_COLUMNS.items())
+    return (
+        "אתה מתרגם שאלה על נתוני משמרות לתוכנית שאילתה. אל תענה על השאלה עצמה.\n"
+        f"עמודות הטבלה:\n{schema}\n"
+        "החזר JSON בלבד, במבנה:\n"
+        '{"filters": [{"column": "...", "op": "==", "value": ...}], '
+        '"group_by": ["..."], '
+        '"aggregations": [{"column": "סהכ שעות", "func": "sum", "as": "..."}], '
+        '"sort": {"by": "...", "desc": true}, "limit": 10}\n'
+        f"op אחד מ: {', '.join(sorted(FILTER_OPS))}. func אחד מ: {', '.join(sorted(AGG_FUNCS))}. "
+        f"{' / '.join(sorted(NUMERIC_FUNCS))} רק על {', '.join(sorted(NUMERIC_COLUMNS))}. "
+        "בלי aggregations מוחזרות השורות עצמן, ואז sort.by הוא אחת העמודות; "
+        "עם aggregations - עמודה מ-group_by או אחד משמות ה-as. between מקבל [מ, עד] כולל.\n"
+        f"שאלה: {question}"
+    )
+
+
+def parse_plan(text):
+    match = re.search(r"\{.*\}", text, re.S)
+    if not match:
+        raise QueryPlanError("המודל לא החזיר תוכנית JSON")
+    try:
+        plan = json.loads(match.group(0))
+    except ValueError as e:
+        raise QueryPlanError(f"JSON לא תקין: {e}")
+    return validate_plan(plan)
+
+
+def _check_column(col):
+    if col not in QUERY_COLUMNS:
+        raise QueryPlanError(f"עמודה לא מוכרת: {col}")
+    return col
+
+
+def _list_of(plan, field, kind):
+    # שדה שחייב להיות רשימה (או חסר) שכל איבר בה מסוג kind
+    items = plan.get(field) or []
+    if not isinstance(items, list) or not all(isinstance(item, kind) for item in items):
+        raise QueryPlanError(f"{field} חייב להיות רשימה של {'אובייקטים' if kind is dict else 'שמות עמודות'}")
+    return items
+
+
+def validate_plan(plan):
+    if not isinstance(plan, dict):
+        raise QueryPlanError("התוכנית חייבת להיות אובייקט JSON")
+    filters = []
+    for f in _list_of(plan, "filters", dict):
+        op = f.get("op")
+        if op not in FILTER_OPS:
+            raise QueryPlanError(f"אופרטור לא מורשה: {op}")
+        value = f.get("value")
+        if op in ("in", "between") and not isinstance(value, list):
+            raise QueryPlanError(f"{op} מצריך רשימת ערכים")
+        if op == "between" and len(value) != 2:
+            raise QueryPlanError("between מצריך בדיוק שני ערכים")
+        filters.append({"column": _check_column(f.get("column")), "op": op, "value": value})
+    group_by = [_check_column(c) for c in _list_of(plan, "group_by", str)]
+    aggregations = []
+    for a in _list_of(plan, "aggregations", dict):
+        func = a.get("func")
+        if func not in AGG_FUNCS:
+            raise QueryPlanError(f"פונקציית סיכום לא מורשית: {func}")
+        col = _check_column(a.get("column", "סהכ שעות"))
+        if func in NUMERIC_FUNCS and col not in NUMERIC_COLUMNS:
+            raise QueryPlanError(f"{func} אפשרי רק על עמודה מספרית, לא על {col}")
+        aggregations.append({"column": col, "func": func, "as": str(a.get("as") or f"{func} {col}")})
+    if group_by and not aggregations:
+        aggregations = [{"column": "סהכ שעות", "func": "sum", "as": "סהכ שעות"}]
+    aliases = [a["as"] for a in aggregations]
+    clash = (set(aliases) & set(group_by)) or {alias for alias in aliases if aliases.count(alias) > 1}
+    if clash:
+        raise QueryPlanError(f"שם תוצאה כפול או זהה לעמודת קיבוץ: {', '.join(sorted(clash))}")
+    sort = plan.get("sort") or None
+    if sort is not None:
+        if not isinstance(sort, dict):
+            raise QueryPlanError("sort חייב להיות אובייקט עם by ו-desc")
+        # אחרי סיכום נשארות רק עמודות הקיבוץ ושמות התוצאות
+        by = sort.get("by")
+        if by not in (group_by + aliases if aggregations else QUERY_COLUMNS):
+            raise QueryPlanError(f"אי אפשר למיין לפי: {by}")
+        sort = {"by": by, "desc": bool(sort.get("desc", True))}
+    try:
+        limit = int(plan.get("limit") or MAX_RESULT_ROWS)
+    except (TypeError, ValueError):
+        raise QueryPlanError("limit חייב להיות מספר")
+    return {"filters": filters, "group_by": group_by, "aggregations": aggregations, "sort": sort,
+            "limit": min(max(limit, 1), MAX_RESULT_ROWS)}
+
+
+def _filter_mask(series, op, value):
+    if series.name == "תאריך יומי":
+        series = series.astype(str)
+    if op == "is_null":
+        return series.isna()
+    if op == "not_null":
+        return series.notna()
+    if op == "in":
+        return series.isin(value)
+    if op == "contains":
+        return series.astype(str).str.contains(str(value), regex=False, na=False)
+    if op == "between":
+        return series.between(value[0], value[1])
+    return {"==": series.eq, "!=": series.ne, ">": series.gt, ">=": series.ge,
+            "<": series.lt, "<=": series.le}[op](value)
+
+
+def run_plan(valid_df, plan):
+    mask = pd.Series(True, index=valid_df.index)
+    for f in plan["filters"]:
+        try:
+            mask &= _filter_mask(valid_df[f["column"]], f["op"], f["value"]).fillna(False)
+        except TypeError:
+            raise QueryPlanError(f"ערך לא מתאים לעמודה {f['column']}: {f['value']!r}")
+    rows = valid_df[mask]
+    if plan["aggregations"]:
+        named = {a["as"]: (a["column"], a["func"]) for a in plan["aggregations"]}
+        if plan["group_by"]:
+            result = rows.groupby(plan["group_by"], sort=False).agg(**named).reset_index()
+        else:
+            result = pd.DataFrame([{name: rows[col].agg(func) for name, (col, func) in named.items()}])
+    else:
+        result = rows[list(QUERY_COLUMNS)]
+    if plan["sort"] is not None:
+        result = result.sort_values(plan["sort"]["by"], ascending=not plan["sort"]["desc"])
+    return result.head(plan["limit"]).round(2)
+
+
+def ask_plan(model, question):
+    # התוכנית תלויה רק בשאלה ובסכמה - נשמרת במטמון גם כשהנתונים משתנים
+    key = ("plan", normalize_question(question))
+    with _lock:
+        plan = _answers.get(key)
+    if plan is None:
+        plan = parse_plan(model.generate_content(build_plan_prompt(question)).text)
+        with _lock:
+            _answers[key] = plan
+            while len(_answers) > ANSWER_CACHE_SIZE:
+                _answers.popitem(last=False)
+    # רק עמודות לוח השנה (חלקים חודשיים שמורים), בלי לבנות את קוביית הסיכומים
+    return plan, run_plan(analytics.get_calendar(), plan)
+
+
+# ==========================================
+# לקוח מקומי לבדיקות ולמדידות - מחקה את google.generativeai
+# ==========================================
+class _StubModelInfo:
+    def __init__(self, name):
+        self.name = name
+        self.supported_generation_methods = ['generateContent']
+
+
+class _StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    def __init__(self, name=DEFAULT_MODEL, reply=None):
+        self.name = name
+        self.reply = reply
+        self.prompts = []
+
+    def generate_content(self, prompt):
+        self.prompts.append(prompt)
+        if self.reply is not None:
+            return _StubResponse(self.reply(prompt) if callable(self.reply) else self.reply)
+        return _StubResponse(f"[stub] {estimate_tokens(prompt)} טוקנים בהקשר")
+
+
+class StubClient:
+    def __init__(self, reply=None):
+        self.reply = reply
+        self.list_calls = 0
+
+    def configure(self, api_key=None):
+        pass
+
+    def list_models(self):
+        self.list_calls += 1
+        return [_StubModelInfo("models/gemini-stub")]
+
+    def GenerativeModel(self, name):
+        return StubModel(name, self.reply)
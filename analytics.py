@@ -0,0 +1,186 @@
+import threading
+from datetime import timedelta
+from itertools import product
+
+import numpy as np
+import pandas as pd
+
+import storage
+
+# ==========================================
+# עמודות לוח שנה נגזרות + קוביית סיכומים למחשבון השעות
+# ==========================================
+ALL = "הכל"
+DAY_MAPPING = {6: "א'", 0: "ב'", 1: "ג'", 2: "ד'", 3: "ה'", 4: "ו'", 5: "ש'"}
+DAYS_ORDER = ["א'", "ב'", "ג'", "ד'", "ה'", "ו'", "ש'"]
+WEEK_COL = "שבוע (מתחיל בראשון)"
+DIMENSIONS = ["שם עובד", "חודש", WEEK_COL, "יום בשבוע"]
+
+
+def get_sunday(dt):
+    days_to_subtract = (dt.weekday() + 1) % 7
+    return (dt - timedelta(days=days_to_subtract)).date()
+
+
+# אותו חישוב כמו get_sunday, וקטורי על מערך datetime64[D]
+# (חשבון תאריכים ב-numpy: 1970-01-01 היה יום חמישי) - מהיר בהרבה מ-strftime
+def weekday_of(days):
+    return (days.view('int64') + 3) % 7
+
+
+def sunday_of(days):
+    return days - ((weekday_of(days) + 1) % 7).astype('timedelta64[D]')
+
+
+def add_calendar_columns(df):
+    valid_df = df.copy()
+    valid_df['datetime'] = pd.to_datetime(valid_df['כניסה'], format=storage.TIME_FMT, errors='coerce')
+    other_format = valid_df['datetime'].isna() & valid_df['כניסה'].notna()
+    if other_format.any():
+        valid_df.loc[other_format, 'datetime'] = pd.to_datetime(valid_df.loc[other_format, 'כניסה'], errors='coerce')
+    valid_df = valid_df.dropna(subset=['datetime'])
+    days = valid_df['datetime'].values.astype('datetime64[D]')
+    weekday = weekday_of(days)
+    sunday = sunday_of(days)
+    valid_df['שם עובד'] = valid_df['שם עובד'].astype(str)
+    valid_df['תאריך יומי'] = valid_df['datetime'].dt.date
+    valid_df['חודש'] = np.datetime_as_string(days.astype('datetime64[M]'), unit='M')
+    valid_df['יום בשבוע'] = pd.Series(weekday, index=valid_df.index).map(DAY_MAPPING)
+    valid_df[WEEK_COL] = np.datetime_as_string(sunday, unit='D')
+    return valid_df
+
+
+# בתוך חלק של חודש אחד: עובד / שבוע / יום
+MONTH_DIMENSIONS = ["שם עובד", WEEK_COL, "יום בשבוע"]
+
+
+def build_cube(valid_df):
+    # סכום שעות לכל צירוף מימדים (כולל "הכל") - Series אחת מ-groupby לכל צירוף,
+    # כך שכל בחירה בפילטרים היא שליפה אחת מהאינדקס שלה
+    hours = valid_df['סהכ שעות'].fillna(0)
+    cube = {}
+    for mask in product([False, True], repeat=len(MONTH_DIMENSIONS)):
+        keys = [valid_df[dim] for dim, used in zip(MONTH_DIMENSIONS, mask) if used]
+        cube[mask] = hours.groupby(keys).sum() if keys else float(hours.sum())
+    return cube
+
+
+class MonthRollup:
+    # חלק של חודש אחד; נבנה מחדש רק כשמשמרת באותו חודש משתנה
+    def __init__(self, month, df):
+        self.month = month
+        # ממוין לפי זמן כניסה, כך שכל חיתוך נשלף כבר בסדר כרונולוגי ואפשר לדפדף בו בלי למיין
+        self.valid_df = add_calendar_columns(df).sort_values('datetime', kind='stable')
+        self.workers = self.valid_df['שם עובד'].unique()
+        self.weeks = self.valid_df[WEEK_COL].unique()
+        self._cube = None
+        self._positions = None
+
+    @property
+    def cube(self):
+        if self._cube is None:
+            self._cube = build_cube(self.valid_df)
+        return self._cube
+
+    @property
+    def positions(self):
+        # מיקומי השורות לכל ערך בכל מימד, לשליפת טבלת הפירוט בלי לסרוק את כל החודש
+        if self._positions is None:
+            self._positions = {dim: self.valid_df.groupby(dim, sort=False).indices for dim in MONTH_DIMENSIONS}
+        return self._positions
+
+    def total(self, worker=ALL, week=ALL, day=ALL):
+        values = [v for v in (worker, week, day) if v != ALL]
+        sums = self.cube[tuple(v != ALL for v in (worker, week, day))]
+        if not values:
+            return sums
+        return float(sums.get(values[0] if len(values) == 1 else tuple(values), 0.0))
+
+    def rows(self, worker=ALL, week=ALL, day=ALL):
+        selected = None
+        for dim, value in zip(MONTH_DIMENSIONS, (worker, week, day)):
+            if value == ALL:
+                continue
+            pos = self.positions[dim].get(value, np.array([], dtype=np.intp))
+            selected = pos if selected is None else np.intersect1d(selected, pos, assume_unique=True)
+        if selected is None:
+            return self.valid_df
+        return self.valid_df.iloc[np.sort(selected)]
+
+
+class Rollup:
+    # חיבור של חלקי החודשים (מהישן לחדש) - סכום הוא סכום החלקים, טבלה היא שרשור שלהם
+    def __init__(self, parts):
+        self.parts = [p for p in parts if not p.valid_df.empty]
+        self._valid_df = None
+        self.workers = pd.unique(np.concatenate([p.workers for p in self.parts])).tolist() if self.parts else []
+        self.months = sorted((p.month for p in self.parts), reverse=True)
+        self.weeks = sorted(set().union(*(p.weeks for p in self.parts)), reverse=True)
+
+    @property
+    def valid_df(self):
+        if self._valid_df is None:
+            self._valid_df = _concat_parts([p.valid_df for p in self.parts])
+        return self._valid_df
+
+    def _parts_for(self, month):
+        return self.parts if month == ALL else [p for p in self.parts if p.month == month]
+
+    def total(self, worker=ALL, month=ALL, week=ALL, day=ALL):
+        return float(sum(p.total(worker, week, day) for p in self._parts_for(month)))
+
+    def rows(self, worker=ALL, month=ALL, week=ALL, day=ALL):
+        if (worker, month, week, day) == (ALL,) * 4:
+            return self.valid_df
+        frames = [p.rows(worker, week, day) for p in self._parts_for(month)]
+        return _concat_parts([f for f in frames if not f.empty])
+
+
+def _concat_parts(frames):
+    if not frames:
+        return add_calendar_columns(pd.DataFrame(columns=storage.COLUMNS))
+    return frames[0] if len(frames) == 1 else pd.concat(frames)
+
+
+_parts = {}
+_rollups = {}
+_rollup_lock = threading.Lock()
+
+
+def _month_parts(months=None):
+    # מחזיר (גרסה, חלקים) לחודשים שנבחרו; רק חודשים שהגרסה שלהם השתנתה נקראים ונבנים מחדש
+    versions = storage.get_month_versions()
+    wanted = sorted(versions) if months is None else sorted(set(months) & set(versions))
+    with _rollup_lock:
+        for stale in [m for m in _parts if m not in versions]:
+            del _parts[stale]
+        hits = {m: _parts.get(m) for m in wanted}
+    stale = [m for m in wanted if hits[m] is None or hits[m][0] != versions[m]]
+    if stale:
+        df = storage.load_data(stale)
+        groups = df.groupby(df['כניסה'].astype(str).str[:7], sort=False).groups if not df.empty else {}
+        for month in stale:
+            part = MonthRollup(month, df.loc[groups[month]] if month in groups else df.iloc[:0])
+            hits[month] = (versions[month], part)
+            with _rollup_lock:
+                _parts[month] = hits[month]
+    return tuple((m, versions[m]) for m in wanted), [hits[m][1] for m in wanted]
+
+
+def get_rollup(months=None):
+    # משותף לכל הסשנים; אחרי החתמה נבנה מחדש רק החלק של החודש שלה
+    key = None if months is None else tuple(sorted(months))
+    version, parts = _month_parts(months)
+    with _rollup_lock:
+        hit = _rollups.get(key)
+        if hit is not None and hit[0] == version:
+            return hit[1]
+    rollup = Rollup(parts)
+    with _rollup_lock:
+        _rollups[key] = (version, rollup)
+    return rollup
+
+
+def get_calendar(months=None):
+    # הטבלה עם עמודות לוח השנה בלבד (בלי קוביית הסיכומים), מאותם חלקים חודשיים
+    return get_rollup(months).valid_df
@@ -1,14 +1,24 @@
 ﻿import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
-import os
 import google.generativeai as genai
+from storage import (load_data, save_changes, load_workers, save_workers, add_worker, get_roster, get_worker_shifts,
+                     get_live_stats, get_available_months, ShiftConflict)
+from shift_service import clock_in, clock_out, correct_shift, local_now, PunchError
+from payroll import report_file
+from analytics import get_rollup, ALL, DAYS_ORDER
+from ai_assistant import resolve_model, ask, ask_plan, QueryPlanError
+import perf
 
 # ==========================================
 # 1. הגדרות ועיצוב (UI/UX)
 # ==========================================
 st.set_page_config(page_title="AI Operational Manager", page_icon="🚀", layout="wide")
 
+# מדידת זמנים לפי שלב בכל ריצה - מופעלת רק מהסביבה (ATTENDANCE_PERF=1), לא מהכתובת:
+# המצב משותף לכל התהליך, ולקוח שלא התחבר לא אמור להיות מסוגל להדליק אותו
+perf.start_run("login")
+
 st.markdown("""
     <style>
     .stButton>button { width: 100%; border-radius: 10px; font-weight: bold; height: 50px; }
@@ -18,38 +28,33 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # ==========================================
-# 2. ניהול משאבים קפדני (with open)
+# 2. דפדוף בטבלאות גדולות - רק עמוד אחד נשלח לדפדפן
 # ==========================================
-FILE_PATH = "attendance.csv"
-WORKERS_PATH = "workers.csv"
+PAGE_SIZES = [25, 50, 100, 200]
+
 
-def load_data():
-    if not os.path.exists(FILE_PATH):
-        return pd.DataFrame(columns=["שם עובד", "כניסה", "יציאה", "סהכ שעות"])
-    with open(FILE_PATH, 'r', encoding='utf-8') as file:
-        return pd.read_csv(file)
+def page_window(total, key):
+    # בחירת עמוד; מחזיר (התחלה, סוף) של השורות שיוצגו
+    col_size, col_page, col_info = st.columns([1, 1, 2])
+    with col_size:
+        page_size = st.selectbox("שורות בעמוד:", PAGE_SIZES, index=1, key=f"{key}_size")
+    pages = max(1, -(-total // page_size))
+    with col_page:
+        page = min(st.number_input("עמוד:", min_value=1, value=1, step=1, key=f"{key}_page"), pages)
+    with col_info:
+        st.caption(f"עמוד {page} מתוך {pages} ({total} שורות)")
+    start = (page - 1) * page_size
+    return start, min(start + page_size, total)
 
-def save_data(df):
-    df = df.dropna(subset=['שם עובד', 'כניסה'])
-    df = df[df['שם עובד'].astype(str).str.strip() != '']
-    if 'סהכ שעות' in df.columns:
-        df['סהכ שעות'] = df['סהכ שעות'].apply(lambda x: x if (pd.notnull(x) and x >= 0) else 0)
-    with open(FILE_PATH, 'w', encoding='utf-8', newline='') as file:
-        df.to_csv(file, index=False)
 
-def load_workers():
-    if not os.path.exists(WORKERS_PATH):
-        df = pd.DataFrame([{"שם עובד": "איתי"}, {"שם עובד": "אורלי"}])
-        save_workers(df)
-        return df
-    with open(WORKERS_PATH, 'r', encoding='utf-8') as file:
-        return pd.read_csv(file)
+def editor_changes(shown, delta):
+    # ה-delta של st.data_editor מתייחס למיקומי שורות בעמוד - ממירים למפתחות משמרת
+    keys = shown[['שם עובד', 'כניסה']].to_numpy()
+    deleted = [tuple(keys[pos]) for pos in delta.get("deleted_rows", [])]
+    renamed = [(tuple(keys[int(pos)]), change['שם עובד'])
+               for pos, change in delta.get("edited_rows", {}).items() if 'שם עובד' in change]
+    return deleted, renamed, pd.DataFrame(delta.get("added_rows", []))
 
-def save_workers(df):
-    df = df.dropna(subset=['שם עובד'])
-    df = df[df['שם עובד'].astype(str).str.strip() != '']
-    with open(WORKERS_PATH, 'w', encoding='utf-8', newline='') as file:
-        df.to_csv(file, index=False)
 
 # ==========================================
 # 3. אתחול משתני מערכת (Session State)
@@ -58,6 +63,9 @@ if 'logged_in' not in st.session_state:
     st.session_state.logged_in = False
     st.session_state.role = None
     st.session_state.user_name = ""
+if 'editor_gen' not in st.session_state:
+    # מתחלף אחרי כל שמירה כדי שהעורך יתחיל נקי מעל הנתונים החדשים
+    st.session_state.editor_gen = 0
 
 # ==========================================
 # 4. מסך התחברות (Login Gateway)
@@ -73,13 +81,13 @@ if not st.session_state.logged_in:
             emp_name = st.text_input("שם עובד / תעודת זהות:", placeholder="הקלד שם מדויק...")
             if st.button("🚪 היכנס כעובד", type="primary"):
                 if emp_name.strip():
-                    workers_df = load_workers()
-                    allowed_workers = workers_df['שם עובד'].astype(str).str.strip().tolist()
+                    # חיפוש באינדקס הרשימה; נכנסים עם השם כפי שהוא ברשימה
+                    worker = get_roster().get(emp_name)
                     
-                    if emp_name.strip() in allowed_workers:
+                    if worker is not None:
                         st.session_state.logged_in = True
                         st.session_state.role = "worker"
-                        st.session_state.user_name = emp_name.strip()
+                        st.session_state.user_name = worker
                         st.rerun()
                     else:
                         st.error("❌ הגישה נדחתה: שמך אינו מופיע ברשימת העובדים המורשים. פנה למנהל.")
@@ -108,8 +116,7 @@ else:
         st.session_state.user_name = ""
         st.rerun()
         
-    df = load_data()
-    ist_now = datetime.utcnow() + timedelta(hours=2)
+    ist_now = local_now()
     now_str = ist_now.strftime("%Y-%m-%d %H:%M")
 
     # ------------------------------------------
@@ -121,7 +128,12 @@ else:
         
         worker_name = st.session_state.user_name
         
-        worker_shifts = df[df["שם עובד"].astype(str).str.strip() == worker_name]
+        # העובד רואה רק את החודש הנוכחי והקודם (משמרת פתוחה מוצגת תמיד)
+        perf.set_page("worker")
+        prev_month = (ist_now.replace(day=1) - timedelta(days=1)).strftime("%Y-%m")
+        with perf.phase("load") as p:
+            worker_shifts = get_worker_shifts(worker_name, months=[prev_month, ist_now.strftime("%Y-%m")])
+            p.rows = len(worker_shifts)
         active_shift = worker_shifts[worker_shifts["יציאה"].isna()]
         
         st.markdown("<br>", unsafe_allow_html=True)
@@ -135,54 +147,65 @@ else:
                     st.success("אתה מחוץ למשמרת. יום עבודה פורה!")
                     
                 if st.button("🟢 כניסה למשמרת עכשיו", type="primary"):
-                    new_row = pd.DataFrame([{"שם עובד": worker_name, "כניסה": now_str, "יציאה": None, "סהכ שעות": None}])
-                    save_data(pd.concat([df, new_row], ignore_index=True))
-                    st.rerun()
+                    try:
+                        with perf.phase("persist"):
+                            clock_in(worker_name, now_str)
+                        st.rerun()
+                    except (ShiftConflict, PunchError) as e:
+                        st.error(f"❌ {e}")
             else:
                 entry_time = active_shift.iloc[0]['כניסה']
                 st.warning(f"אתה במשמרת פעילה החל מ- {entry_time}.")
                 if st.button("🔴 יציאה ממשמרת", type="primary"):
-                    idx = active_shift.index[-1]
-                    df.at[idx, "יציאה"] = now_str
-                    t1 = datetime.strptime(df.at[idx, "כניסה"], "%Y-%m-%d %H:%M")
-                    t2 = datetime.strptime(now_str, "%Y-%m-%d %H:%M")
-                    df.at[idx, "סהכ שעות"] = round((t2 - t1).total_seconds() / 3600, 2)
-                    save_data(df)
-                    st.balloons()
-                    st.rerun()
+                    try:
+                        with perf.phase("persist"):
+                            clock_out(worker_name, now_str, entry=active_shift.iloc[-1]['כניסה'])
+                        st.balloons()
+                        st.rerun()
+                    except (ShiftConflict, PunchError) as e:
+                        st.error(f"❌ {e}")
 
     # ------------------------------------------
     # מבט מנהל
     # ------------------------------------------
     elif st.session_state.role == "manager":
         st.title("🚀 פאנל ניהול עסק מורחב")
-        menu = st.sidebar.radio("ניווט מנהל:", ["📊 דשבורד ונוכחות", "⏱️ החתמה ותיקון שעות", "👥 ניהול עובדים", "🤖 עוזר AI"])
+        # מסך הביצועים מופיע רק כשהמדידה פעילה
+        menu = st.sidebar.radio("ניווט מנהל:", ["📊 דשבורד ונוכחות", "⏱️ החתמה ותיקון שעות", "👥 ניהול עובדים", "🤖 עוזר AI"]
+                                + (["📈 ביצועים"] if perf.ENABLED else []))
+        perf.set_page(menu)
         
         if menu == "📊 דשבורד ונוכחות":
-            active_workers_df = df[df["יציאה"].isna()] if not df.empty else pd.DataFrame()
-            active_count = len(active_workers_df)
-            total_hours = df["סהכ שעות"].sum() if not df.empty else 0
+            # טוענים רק את החודש שנבחר (ברירת מחדל: האחרון) - חודשים ישנים נקראים רק לפי בקשה
+            with perf.phase("load") as p:
+                months_available = get_available_months()
+                load_month = st.selectbox("🗂️ חודש לטעינה:", months_available + [ALL])
+                load_months = None if load_month == ALL else [load_month]
+                df = load_data(load_months)
+                live = get_live_stats()
+                p.rows = len(df)
+            active_count = live.active_count
             
             c1, c2, c3 = st.columns(3)
             c1.metric("עובדים כעת", active_count)
-            c2.metric("סה\"כ שעות במערכת", f"{total_hours:.1f}")
-            c3.metric("משמרות חריגות (>9ש')", len(df[df["סהכ שעות"] > 9]) if not df.empty else 0)
+            c2.metric("סה\"כ שעות במערכת", f"{live.total_hours:.1f}")
+            c3.metric("משמרות חריגות (>9ש')", live.long_shifts)
 
             st.markdown("---")
             st.subheader("⚡ עובדים פעילים (סגירת משמרת מיידית)")
             if active_count > 0:
-                for idx, row in active_workers_df.iterrows():
+                for name, entry in live.open:
                     col_name, col_btn = st.columns([3, 1])
                     with col_name:
-                        st.markdown(f"**{row['שם עובד']}** (נכנס ב: {row['כניסה']})")
+                        st.markdown(f"**{name}** (נכנס ב: {entry})")
                     with col_btn:
-                        if st.button(f"🔴 הוצא עכשיו", key=f"btn_{idx}"):
-                            df.at[idx, "יציאה"] = now_str
-                            t1 = datetime.strptime(df.at[idx, "כניסה"], "%Y-%m-%d %H:%M")
-                            t2 = datetime.strptime(now_str, "%Y-%m-%d %H:%M")
-                            df.at[idx, "סהכ שעות"] = round((t2 - t1).total_seconds() / 3600, 2)
-                            save_data(df)
-                            st.rerun()
+                        if st.button(f"🔴 הוצא עכשיו", key=f"btn_{name}_{entry}"):
+                            try:
+                                with perf.phase("persist"):
+                                    clock_out(name, now_str, entry=entry)
+                                st.rerun()
+                            except (ShiftConflict, PunchError) as e:
+                                st.error(f"❌ {e}")
             else:
                 st.info("אין עובדים במשמרת כרגע.")
 
@@ -193,75 +216,87 @@ else:
             st.subheader("🔎 מחשבון שעות וסינון חכם")
             
             if not df.empty and 'סהכ שעות' in df.columns:
-                valid_df = df.copy()
-                valid_df['datetime'] = pd.to_datetime(valid_df['כניסה'], errors='coerce')
-                valid_df = valid_df.dropna(subset=['datetime'])
+                with perf.phase("derive") as p:
+                    rollup = get_rollup(load_months)
+                    p.rows = len(rollup.valid_df)
                 
-                if not valid_df.empty:
-                    valid_df['תאריך יומי'] = valid_df['datetime'].dt.date
-                    valid_df['חודש'] = valid_df['datetime'].dt.strftime('%Y-%m')
-                    
-                    day_mapping = {6: "א'", 0: "ב'", 1: "ג'", 2: "ד'", 3: "ה'", 4: "ו'", 5: "ש'"}
-                    valid_df['יום בשבוע'] = valid_df['datetime'].dt.weekday.map(day_mapping)
-                    
-                    def get_sunday(dt):
-                        days_to_subtract = (dt.weekday() + 1) % 7 
-                        return (dt - timedelta(days=days_to_subtract)).date()
-                    
-                    valid_df['שבוע (מתחיל בראשון)'] = valid_df['datetime'].apply(get_sunday)
-                    
+                if not rollup.valid_df.empty:
                     # הפילטרים למנהל
                     st.write("בחר את חיתוך הנתונים הרצוי כדי לראות סכום שעות מדויק:")
                     col_f1, col_f2, col_f3, col_f4 = st.columns(4)
                     with col_f1:
-                        all_workers = ["הכל"] + valid_df['שם עובד'].unique().tolist()
-                        selected_worker = st.selectbox("👤 בחר עובד:", all_workers)
+                        selected_worker = st.selectbox("👤 בחר עובד:", [ALL] + rollup.workers)
                     with col_f2:
-                        all_months = ["הכל"] + sorted(valid_df['חודש'].unique().tolist(), reverse=True)
-                        selected_month = st.selectbox("📅 בחר חודש:", all_months)
+                        selected_month = st.selectbox("📅 בחר חודש:", [ALL] + rollup.months)
                     with col_f3:
-                        all_weeks = ["הכל"] + sorted(valid_df['שבוע (מתחיל בראשון)'].astype(str).unique().tolist(), reverse=True)
-                        selected_week = st.selectbox("🗓️ שבוע (מתחיל ב-):", all_weeks)
+                        selected_week = st.selectbox("🗓️ שבוע (מתחיל ב-):", [ALL] + rollup.weeks)
                     with col_f4:
-                        days_order = ["הכל", "א'", "ב'", "ג'", "ד'", "ה'", "ו'", "ש'"]
-                        selected_day = st.selectbox("📆 יום בשבוע:", days_order)
+                        selected_day = st.selectbox("📆 יום בשבוע:", [ALL] + DAYS_ORDER)
                         
-                    # סינון הנתונים בזמן אמת
-                    filtered_df = valid_df.copy()
-                    if selected_worker != "הכל":
-                        filtered_df = filtered_df[filtered_df['שם עובד'] == selected_worker]
-                    if selected_month != "הכל":
-                        filtered_df = filtered_df[filtered_df['חודש'] == selected_month]
-                    if selected_week != "הכל":
-                        filtered_df = filtered_df[filtered_df['שבוע (מתחיל בראשון)'].astype(str) == selected_week]
-                    if selected_day != "הכל":
-                        filtered_df = filtered_df[filtered_df['יום בשבוע'] == selected_day]
-                        
-                    # חישוב הסכום של הטבלה המסוננת
-                    total_filtered_hours = filtered_df['סהכ שעות'].sum()
+                    # הסכום מגיע מקוביית הסיכומים, והטבלה נשלפת רק עבור החיתוך שנבחר
+                    with perf.phase("filter") as p:
+                        total_filtered_hours = rollup.total(selected_worker, selected_month, selected_week, selected_day)
+                        filtered_df = rollup.rows(selected_worker, selected_month, selected_week, selected_day)
+                        p.rows = len(filtered_df)
                     
                     # הצגת המספר הגדול שביקשת!
                     st.success(f"🎯 סה\"כ שעות עבודה לפי הסינון הנוכחי: **{total_filtered_hours:.2f}** שעות")
                     
                     st.write(f"**מציג {len(filtered_df)} משמרות שעונות על התנאים:**")
-                    st.dataframe(filtered_df[['שם עובד', 'כניסה', 'יציאה', 'סהכ שעות', 'יום בשבוע', 'חודש', 'שבוע (מתחיל בראשון)']].sort_values(by='כניסה', ascending=False), use_container_width=True)
+                    # השורות כבר ממוינות לפי זמן - חותכים את העמוד מהסוף כדי להציג מהחדש לישן
+                    start, end = page_window(len(filtered_df), "detail")
+                    page_df = filtered_df.iloc[len(filtered_df) - end:len(filtered_df) - start][::-1]
+                    with perf.phase("render", len(page_df)):
+                        st.dataframe(page_df[['שם עובד', 'כניסה', 'יציאה', 'סהכ שעות', 'יום בשבוע', 'חודש', 'שבוע (מתחיל בראשון)']], use_container_width=True)
 
                 else:
                     st.info("עדיין אין משמרות סגורות להצגת סיכומים.")
             else:
                 st.info("אין נתונים זמינים.")
 
+            st.markdown("---")
+            st.subheader("📥 דו\"ח שכר (יומי / שבועי / חודשי, כולל שעות נוספות)")
+            if months_available:
+                col_p1, col_p2, col_p3 = st.columns(3)
+                with col_p1:
+                    report_from = st.selectbox("מחודש:", months_available, key="payroll_from")
+                with col_p2:
+                    report_to = st.selectbox("עד חודש:", months_available, key="payroll_to")
+                with col_p3:
+                    report_fmt = st.radio("פורמט:", ["csv", "xlsx"], horizontal=True, key="payroll_fmt")
+                report_from, report_to = sorted([report_from, report_to])
+                report_end = (pd.Period(report_to, freq="M").end_time.date()).isoformat()
+                # הדו"ח נבנה רק בלחיצה, ישר לקובץ זמני
+                st.download_button("📥 הורד דו\"ח שכר", data=lambda: report_file(report_fmt, f"{report_from}-01", report_end),
+                                   file_name=f"payroll_{report_from}_{report_to}.{report_fmt}", on_click="ignore",
+                                   mime="text/csv" if report_fmt == "csv" else "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+            else:
+                st.info("אין נתונים זמינים.")
+
             st.markdown("---")
             st.subheader("📝 מאגר נתונים מלא לעריכה מהירה")
-            edited = st.data_editor(df, num_rows="dynamic", use_container_width=True, disabled=["כניסה", "יציאה", "סהכ שעות"])
+            start, end = page_window(len(df), "editor")
+            shown = df.iloc[start:end]
+            editor_key = f"shifts_editor_{load_month}_{start}_{end}_{st.session_state.editor_gen}"
+            with perf.phase("render", len(shown)):
+                st.data_editor(shown, key=editor_key, num_rows="dynamic", use_container_width=True, disabled=["כניסה", "יציאה", "סהכ שעות"])
             if st.button("💾 שמור מחיקות / שינויי שמות"):
-                save_data(edited)
-                st.success("הנתונים נשמרו בהצלחה.")
-                st.rerun()
+                # נשמרות רק השורות שהשתנו בעורך, לא הטבלה כולה
+                deleted, renamed, added = editor_changes(shown, st.session_state[editor_key])
+                try:
+                    with perf.phase("persist", len(deleted) + len(renamed) + len(added)):
+                        save_changes(deleted, renamed, added)
+                    st.session_state.editor_gen += 1
+                    st.success("הנתונים נשמרו בהצלחה.")
+                    st.rerun()
+                except ValueError as e:
+                    st.error(f"❌ {e}")
 
         elif menu == "⏱️ החתמה ותיקון שעות":
             st.subheader("תיקון נוכחות: סגירה/פתיחה ועריכת היסטוריה")
-            workers_list = load_workers()['שם עובד'].tolist()
+            with perf.phase("load") as p:
+                workers_list = get_roster().workers()
+                p.rows = len(workers_list)
             if not workers_list:
                 st.warning("אין עובדים במערכת. אנא הוסף עובדים בלשונית 'ניהול עובדים'.")
             else:
@@ -281,42 +316,50 @@ else:
                     custom_dt_str = datetime.combine(selected_date, selected_time).strftime("%Y-%m-%d %H:%M")
                     
                     if worker_name_raw:
-                        active_shift = df[(df["שם עובד"].astype(str).str.strip() == worker_name_raw) & (df["יציאה"].isna())]
+                        # רשימת חודשים ריקה = רק המשמרות הפתוחות של העובד
+                        with perf.phase("load"):
+                            worker_df = get_worker_shifts(worker_name_raw, months=[])
+                        active_shift = worker_df[worker_df["יציאה"].isna()]
                         
                         if active_shift.empty:
                             st.info(f"לעובד **{worker_name_raw}** אין משמרת פתוחה כרגע.")
                             if st.button(f"🟢 פתח משמרת החל מ- {custom_dt_str}", use_container_width=True):
-                                new_row = pd.DataFrame([{"שם עובד": worker_name_raw, "כניסה": custom_dt_str, "יציאה": None, "סהכ שעות": None}])
-                                save_data(pd.concat([df, new_row], ignore_index=True))
-                                st.success(f"נפתחה משמרת ל-{worker_name_raw} בתאריך {custom_dt_str}")
-                                st.rerun()
+                                try:
+                                    with perf.phase("persist"):
+                                        clock_in(worker_name_raw, custom_dt_str)
+                                    st.success(f"נפתחה משמרת ל-{worker_name_raw} בתאריך {custom_dt_str}")
+                                    st.rerun()
+                                except (ShiftConflict, PunchError) as e:
+                                    st.error(f"❌ {e}")
                         else:
                             entry_time = active_shift.iloc[0]['כניסה']
                             st.warning(f"שים לב: לעובד **{worker_name_raw}** יש משמרת פתוחה שהחלה ב- {entry_time}")
                             if st.button(f"🔴 סגור משמרת בתאריך ושעה שנבחרו ({custom_dt_str})", type="primary", use_container_width=True):
-                                idx = active_shift.index[-1]
-                                t1 = datetime.strptime(entry_time, "%Y-%m-%d %H:%M")
-                                t2 = datetime.combine(selected_date, selected_time)
-                                
-                                if t2 < t1:
-                                    st.error("❌ שגיאה: זמן היציאה שבחרת מוקדם מזמן הכניסה של העובד!")
-                                else:
-                                    df.at[idx, "יציאה"] = custom_dt_str
-                                    df.at[idx, "סהכ שעות"] = round((t2 - t1).total_seconds() / 3600, 2)
-                                    save_data(df)
+                                try:
+                                    with perf.phase("persist"):
+                                        clock_out(worker_name_raw, custom_dt_str, entry=active_shift.iloc[-1]['כניסה'])
                                     st.success("משמרת נסגרה ועודכנה בהצלחה!")
                                     st.rerun()
+                                except (ShiftConflict, PunchError) as e:
+                                    st.error(f"❌ {e}")
 
                 elif action_type == "עריכת משמרת שהסתיימה (תיקון שעות עבר)":
-                    closed_shifts = df[(df["שם עובד"].astype(str).str.strip() == worker_name_raw) & (df["יציאה"].notna())]
+                    # חלון של חודש אחד בכל פעם במקום כל ההיסטוריה של העובד
+                    edit_month = st.selectbox("📅 חודש המשמרת:", get_available_months())
+                    with perf.phase("load") as p:
+                        worker_df = get_worker_shifts(worker_name_raw, months=[edit_month] if edit_month else [])
+                        p.rows = len(worker_df)
+                    closed_shifts = worker_df[worker_df["יציאה"].notna()]
                     
                     if closed_shifts.empty:
-                        st.info("אין משמרות קודמות שהסתיימו לעובד זה.")
+                        st.info("אין משמרות שהסתיימו לעובד זה בחודש שנבחר.")
                     else:
-                        shift_dict = {idx: f"כניסה: {row['כניסה']} | יציאה: {row['יציאה']} ({row['סהכ שעות']} שעות)" for idx, row in closed_shifts.iterrows()}
+                        labels = ("כניסה: " + closed_shifts['כניסה'].astype(str) + " | יציאה: " + closed_shifts['יציאה'].astype(str)
+                                  + " (" + closed_shifts['סהכ שעות'].astype(str) + " שעות)")
+                        shift_dict = dict(zip(closed_shifts.index, labels))
                         selected_shift_idx = st.selectbox("בחירת משמרת לעריכה:", options=list(shift_dict.keys()), format_func=lambda x: shift_dict[x])
                         
-                        selected_row = df.loc[selected_shift_idx]
+                        selected_row = closed_shifts.loc[selected_shift_idx]
                         orig_in_dt = datetime.strptime(selected_row['כניסה'], "%Y-%m-%d %H:%M")
                         orig_out_dt = datetime.strptime(selected_row['יציאה'], "%Y-%m-%d %H:%M")
                         
@@ -340,22 +383,19 @@ else:
                         confirm_edit = st.checkbox("⚠️ אני מאשר/ת שאני רוצה לדרוס את נתוני המשמרת הקיימת ולעדכן לשעות החדשות")
                         
                         if st.button("💾 עדכן משמרת ושמור נתונים", type="primary", disabled=not confirm_edit):
-                            t1 = datetime.strptime(new_in_str, "%Y-%m-%d %H:%M")
-                            t2 = datetime.strptime(new_out_str, "%Y-%m-%d %H:%M")
-                            
-                            if t2 < t1:
-                                st.error("❌ שגיאה: זמן היציאה שבחרת מוקדם מזמן הכניסה!")
-                            else:
-                                df.at[selected_shift_idx, "כניסה"] = new_in_str
-                                df.at[selected_shift_idx, "יציאה"] = new_out_str
-                                df.at[selected_shift_idx, "סהכ שעות"] = round((t2 - t1).total_seconds() / 3600, 2)
-                                save_data(df)
+                            try:
+                                with perf.phase("persist"):
+                                    correct_shift(selected_row['שם עובד'], selected_row['כניסה'], new_in_str, new_out_str)
                                 st.success("המשמרת עודכנה בהצלחה!")
                                 st.rerun()
+                            except (ShiftConflict, PunchError) as e:
+                                st.error(f"❌ {e}")
 
         elif menu == "👥 ניהול עובדים":
             st.subheader("🔒 רשימת גישה: מי מורשה להחתים שעון?")
-            workers_df = load_workers()
+            with perf.phase("load") as p:
+                workers_df = load_workers()
+                p.rows = len(workers_df)
             col_add1, col_add2 = st.columns([3, 1])
             with col_add1:
                 new_worker = st.text_input("הוסף עובד חדש לרשימה (שם מלא / ת.ז):")
@@ -363,10 +403,10 @@ else:
                 st.markdown("<br>", unsafe_allow_html=True)
                 if st.button("➕ הוסף למורשים", use_container_width=True):
                     if new_worker.strip():
-                        if new_worker.strip() not in workers_df['שם עובד'].astype(str).str.strip().tolist():
-                            new_row = pd.DataFrame([{"שם עובד": new_worker.strip()}])
-                            save_workers(pd.concat([workers_df, new_row], ignore_index=True))
-                            st.success(f"העובד '{new_worker.strip()}' נוסף בהצלחה!")
+                        with perf.phase("persist"):
+                            added_name = add_worker(new_worker)
+                        if added_name is not None:
+                            st.success(f"העובד '{added_name}' נוסף בהצלחה!")
                             st.rerun()
                         else:
                             st.warning("עובד זה כבר קיים במערכת.")
@@ -374,7 +414,8 @@ else:
             st.markdown("---")
             edited_workers = st.data_editor(workers_df, num_rows="dynamic", use_container_width=True)
             if st.button("💾 שמור רשימת עובדים מעודכנת"):
-                save_workers(edited_workers)
+                with perf.phase("persist", len(edited_workers)):
+                    save_workers(edited_workers)
                 st.success("הרשאות הגישה עודכנו בהצלחה.")
                 st.rerun()
 
@@ -383,22 +424,52 @@ else:
             API_KEY = st.secrets.get("GEMINI_API_KEY", "") 
             if API_KEY:
                 genai.configure(api_key=API_KEY)
-                best_model = "gemini-1.5-flash"
-                try:
-                    for m in genai.list_models():
-                        if 'generateContent' in m.supported_generation_methods and 'gemini' in m.name.lower():
-                            best_model = m.name
-                            break
-                except Exception: pass
+                best_model = resolve_model(genai, cache_key=API_KEY)
                 
                 model = genai.GenerativeModel(best_model)
                 st.caption(f"✅ מחובר למנוע: `{best_model}`")
                 
+                ai_mode = st.radio("אופן ניתוח:", ["⚡ חישוב מקומי (המודל מתכנן, המערכת מחשבת)", "📄 שליחת סיכום נתונים למודל"], horizontal=True)
                 q = st.text_input("שאל על נתוני העבודה:")
                 if q:
                     with st.spinner("מנתח..."):
                         try:
-                            res = model.generate_content(f"נתוני משמרות:\n{df.to_string()}\nשאלה: {q}")
-                            st.info(res.text)
+                            if ai_mode.startswith("⚡"):
+                                with perf.phase("ai") as p:
+                                    plan, result = ask_plan(model, q)
+                                    p.rows = len(result)
+                                st.dataframe(result, use_container_width=True)
+                                with st.expander("תוכנית השאילתה"):
+                                    st.json(plan)
+                            else:
+                                with perf.phase("ai"):
+                                    answer = ask(model, q)
+                                st.info(answer)
+                        except QueryPlanError as e:
+                            st.error(f"לא הצלחתי לתרגם את השאלה לשאילתה: {e}")
                         except Exception as e:
-                            st.error(f"שגיאת AI: {e}")
\ No newline at end of file
+                            st.error(f"שגיאת AI: {e}")
+
+        elif menu == "📈 ביצועים":
+            st.subheader("📈 זמני ריצה לפי שלב")
+            st.caption(f"אחוזונים מתגלגלים על {perf.WINDOW} הריצות האחרונות בתהליך (כל הסשנים). "
+                       "שורות = מספר השורות שעובדו בשלב.")
+            stats = perf.summary()
+            if stats:
+                st.dataframe(pd.DataFrame(stats).set_index("phase"), use_container_width=True)
+                with st.expander("ריצות אחרונות"):
+                    st.dataframe(pd.json_normalize(perf.recent_runs()[::-1][:50]), use_container_width=True)
+            else:
+                st.info("עדיין אין מדידות.")
+            col_e1, col_e2 = st.columns(2)
+            with col_e1:
+                st.download_button("📥 ייצוא JSON Lines", data=perf.export_jsonl, file_name="perf_runs.jsonl",
+                                   mime="application/jsonl", on_click="ignore")
+            with col_e2:
+                if st.button("🧹 איפוס מדידות"):
+                    perf.reset()
+                    st.rerun()
+            if perf.LOG_PATH:
+                st.caption(f"כל ריצה נכתבת גם ל- `{perf.LOG_PATH}`")
+
+perf.end_run()
@@ -0,0 +1,215 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import ai_assistant
+import analytics
+import shift_service
+import storage
+
+# ==========================================
+# מחולל נתונים סינתטיים + מדידת המסלולים החמים (בלי Streamlit)
+# ==========================================
+SIZES = [10_000, 100_000, 1_000_000]
+BASE_DATE = np.datetime64("2023-01-01T00:00")
+QUESTION = "כמה שעות עבד עובד-00001 בחודש האחרון?"
+
+
+def generate_data(work_dir, rows, workers=None, open_ratio=0.02, night_ratio=0.05, seed=0):
+    # attendance.csv + workers.csv: לכל עובד רצף משמרות (יום-יומיים בין משמרות), חלקן לילה
+    # שחוצות חצות, חלקן ארוכות מ-9 שעות, והמשמרת האחרונה של חלק מהעובדים עדיין פתוחה
+    workers = workers or max(10, rows // 200)
+    rng = np.random.default_rng(seed)
+    names = np.array([f"עובד-{i:05d}" for i in range(workers)], dtype=object)
+    per_worker = np.full(workers, rows // workers)
+    per_worker[:rows % workers] += 1
+    starts = np.cumsum(per_worker) - per_worker
+    worker = np.repeat(np.arange(workers), per_worker)
+    seq = np.arange(rows) - np.repeat(starts, per_worker)
+
+    gaps = np.cumsum(rng.integers(1, 3, rows))
+    # עובד בלי משמרות (פחות שורות מעובדים) לא תורם נקודת התחלה
+    has_rows = per_worker > 0
+    day = gaps - np.repeat(gaps[starts[has_rows]], per_worker[has_rows])
+    night = rng.random(rows) < night_ratio
+    start_minute = np.where(night, 22 * 60, 6 * 60 + rng.integers(0, 240, rows))
+    duration = np.clip(rng.normal(8.5, 1.5, rows), 3, 14) * 60
+    entry = BASE_DATE + day.astype("timedelta64[D]") + start_minute.astype("timedelta64[m]")
+    exit_ = entry + duration.astype("int64").astype("timedelta64[m]")
+
+    is_open = (seq == per_worker[worker] - 1) & (rng.random(workers) < open_ratio)[worker]
+    as_text = lambda values: (np.char.replace(np.datetime_as_string(values, unit="m"), "T", " ").astype(object)
+                              if len(values) else values.astype(object))
+    df = pd.DataFrame({
+        "שם עובד": names[worker],
+        "כניסה": as_text(entry),
+        "יציאה": np.where(is_open, None, as_text(exit_)),
+        "סהכ שעות": np.where(is_open, np.nan, np.round((exit_ - entry) / np.timedelta64(1, "h"), 2)),
+    }).iloc[np.argsort(entry, kind="stable")]
+
+    os.makedirs(work_dir, exist_ok=True)
+    df.to_csv(os.path.join(work_dir, storage.FILE_PATH), index=False, encoding="utf-8")
+    pd.DataFrame({"שם עובד": names}).to_csv(os.path.join(work_dir, storage.WORKERS_PATH), index=False,
+                                               encoding="utf-8")
+    return len(df), workers
+
+
+def _measure(fn, repeat, setup=None):
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {"median_ms": round(statistics.median(times) * 1000, 3), "min_ms": round(min(times) * 1000, 3),
+            "runs": repeat}
+
+
+def _cold():
+    # כמו תהליך שרק עלה / נתונים שהשתנו מתהליך אחר
+    with storage._cache_lock:
+        storage._cache.clear()
+    with analytics._rollup_lock:
+        analytics._rollups.clear()
+        analytics._parts.clear()
+    with ai_assistant._lock:
+        ai_assistant._answers.clear()
+
+
+def _use_backend(backend):
+    storage.BACKEND = backend
+    storage._backend = None
+    if backend == "sqlite":
+        storage.migrate_csv_to_sqlite()
+    elif backend == "parquet":
+        storage.migrate_csv_to_parquet()
+    _cold()
+
+
+def bench_size(rows, backend="csv", repeat=3, punches=20, keep_dir=None):
+    work_dir = keep_dir or tempfile.mkdtemp(prefix=f"bench_{rows}_")
+    cwd = os.getcwd()
+    try:
+        _, workers = generate_data(work_dir, rows)
+        os.chdir(work_dir)
+        _use_backend(backend)
+        results = {"rows": rows, "workers": workers}
+
+        results["load_data_cold"] = _measure(storage.load_data, repeat, setup=_cold)
+        results["load_data_warm"] = _measure(storage.load_data, repeat)
+        df = storage.load_data()
+        results["save_data"] = _measure(lambda: storage.save_data(df), repeat)
+
+        # כניסה + יציאה דרך שירות המשמרות, לעובדים שאין להם משמרת פתוחה
+        busy = {name for name, _ in storage.get_live_stats().open}
+        free = [n for n in storage.load_workers()['שם עובד'] if n not in busy][:punches]
+        now = datetime(2030, 1, 1, 8, 0)
+        start = time.perf_counter()
+        for name in free:
+            shift_service.clock_in(name, now.strftime(storage.TIME_FMT))
+            shift_service.clock_out(name, now.replace(hour=16).strftime(storage.TIME_FMT))
+        elapsed = time.perf_counter() - start
+        results["clock_in_out_per_punch"] = {"median_ms": round(elapsed * 1000 / max(1, 2 * len(free)), 3),
+                                             "runs": 2 * len(free)}
+
+        results["dashboard_metrics_cold"] = _measure(storage.get_live_stats, repeat, setup=_cold)
+        results["dashboard_metrics_warm"] = _measure(storage.get_live_stats, repeat)
+
+        df = storage.load_data()
+        results["derive_calendar_columns"] = _measure(lambda: analytics.add_calendar_columns(df), repeat)
+        entries = pd.to_datetime(df['כניסה'], format=storage.TIME_FMT, errors='coerce').dropna()
+        results["get_sunday_scalar"] = _measure(lambda: [analytics.get_sunday(dt) for dt in entries], 1)
+        results["filter_calculator_build"] = _measure(analytics.get_rollup, repeat, setup=_cold)
+        rollup = analytics.get_rollup()
+        worker, month = rollup.workers[0], rollup.months[0]
+        results["filter_calculator_query"] = _measure(
+            lambda: (rollup.total(worker, month), rollup.rows(worker, month)), repeat)
+
+        results["ai_context"] = _measure(lambda: ai_assistant.build_context(rollup.valid_df, QUESTION), repeat)
+        results["ai_plan_prompt"] = _measure(lambda: ai_assistant.build_plan_prompt(QUESTION), repeat)
+        model = ai_assistant.StubModel()
+        results["ai_ask_uncached"] = _measure(lambda: ai_assistant.ask(model, QUESTION), repeat,
+                                              setup=ai_assistant._answers.clear)
+        return results
+    finally:
+        os.chdir(cwd)
+        storage._backend = None
+        _cold()
+        if keep_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_benchmarks(sizes=SIZES, backend="csv", repeat=3):
+    return {
+        "commit": _commit(),
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "backend": backend,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "results": {str(rows): bench_size(rows, backend, repeat) for rows in sizes},
+    }
+
+
+def compare(old, new):
+    # יחס זמנים (חדש / ישן) לכל מדידה - מעל 1 זה האטה
+    lines = []
+    for size, metrics in new["results"].items():
+        before = old["results"].get(size, {})
+        for name, value in metrics.items():
+            if isinstance(value, dict) and isinstance(before.get(name), dict) and before[name]["median_ms"]:
+                ratio = value["median_ms"] / before[name]["median_ms"]
+                lines.append(f"{size:>8} {name:<28} {before[name]['median_ms']:>10.2f} -> "
+                             f"{value['median_ms']:>10.2f} ms  x{ratio:.2f}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="נתונים סינתטיים ומדידת ביצועים")
+    sub = parser.add_subparsers(dest="command", required=True)
+    gen = sub.add_parser("generate", help="כתיבת attendance.csv ו-workers.csv סינתטיים")
+    gen.add_argument("--rows", type=int, default=100_000)
+    gen.add_argument("--workers", type=int, default=None)
+    gen.add_argument("--open-ratio", type=float, default=0.02)
+    gen.add_argument("--dir", default=".")
+    run = sub.add_parser("run", help="מדידת המסלולים החמים לכל גודל")
+    run.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    run.add_argument("--backend", choices=["csv", "sqlite", "parquet"], default="csv")
+    run.add_argument("--repeat", type=int, default=3)
+    run.add_argument("--out", default="benchmark_results.json")
+    cmp_ = sub.add_parser("compare", help="השוואה בין שתי ריצות")
+    cmp_.add_argument("old")
+    cmp_.add_argument("new")
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        count, workers = generate_data(args.dir, args.rows, args.workers, args.open_ratio)
+        print(f"נכתבו {count} משמרות ל-{workers} עובדים ב- {args.dir}")
+    elif args.command == "run":
+        report = run_benchmarks(args.sizes, args.backend, args.repeat)
+        with open(args.out, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        with open(args.old, encoding='utf-8') as old_file, open(args.new, encoding='utf-8') as new_file:
+            print(compare(json.load(old_file), json.load(new_file)))
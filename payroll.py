@@ -0,0 +1,202 @@
+import argparse
+import io
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import storage
+from analytics import sunday_of
+
+# ==========================================
+# דו"ח שכר: סיכום יומי / שבועי / חודשי לכל עובד, עם דרגות שעות נוספות
+# ==========================================
+# הדו"ח נבנה חודש אחרי חודש ומוחזר כמנות מ-generator - ימים / שבועות שעדיין יכולים לקבל
+# שעות מהחודש הבא (משמרת לילה בסוף החודש, שבוע שחוצה חודש) מחכים למנה הבאה.
+DAILY, WEEKLY, MONTHLY = "יומי", "שבועי", "חודשי"
+LEVELS = [DAILY, WEEKLY, MONTHLY]
+# עד סף המשמרת החריגה (9 ש') - רגילות; השעתיים הבאות 125%; כל השאר 150%. החישוב לפי יום עבודה
+# (כל המשמרות שנכנסו באותו יום, לפי הסדר), לפני הפיצול לימים קלנדריים - משמרת לילה של 12 ש'
+# מקבלת שעות נוספות גם כשכל חצי שלה נופל על יום אחר.
+OVERTIME_TIERS = [("שעות רגילות", storage.LONG_SHIFT_HOURS), ("נוספות 125%", 2), ("נוספות 150%", None)]
+TIER_COLUMNS = [label for label, _ in OVERTIME_TIERS]
+SUM_COLUMNS = ["משמרות", "סהכ שעות"] + TIER_COLUMNS
+REPORT_COLUMNS = ["רמה", "שם עובד", "תקופה"] + SUM_COLUMNS
+
+
+def split_by_day(df):
+    # משמרת שחוצה חצות מתפצלת לקטע לכל יום קלנדרי; המשמרת נספרת ביום הכניסה,
+    # וכל קטע מקבל את חלקו בדרגות של יום העבודה שלה
+    entry = pd.to_datetime(df['כניסה'], format=storage.TIME_FMT, errors='coerce')
+    exit_ = pd.to_datetime(df['יציאה'], format=storage.TIME_FMT, errors='coerce')
+    ok = (entry.notna() & exit_.notna() & (exit_ >= entry)).to_numpy()
+    names = df['שם עובד'].astype(str).str.strip().to_numpy()[ok]
+    start = entry.to_numpy()[ok].astype('datetime64[m]')
+    end = exit_.to_numpy()[ok].astype('datetime64[m]')
+    first = start.astype('datetime64[D]')
+    worked_before = _worked_before(names, first, start, (end - start) / np.timedelta64(1, 'h'))
+    # יציאה בדיוק בחצות לא פותחת קטע ריק ביום שאחרי
+    last = np.maximum((end - np.timedelta64(1, 'm')).astype('datetime64[D]'), first)
+    spans = (last - first).astype('int64') + 1
+    shift = np.repeat(np.arange(len(start)), spans)
+    offset = np.arange(len(shift)) - np.repeat(np.cumsum(spans) - spans, spans)
+    day = first[shift] + offset.astype('timedelta64[D]')
+    seg_start = np.maximum(start[shift], day.astype('datetime64[m]'))
+    seg_end = np.minimum(end[shift], (day + np.timedelta64(1, 'D')).astype('datetime64[m]'))
+    hours = (seg_end - seg_start) / np.timedelta64(1, 'h')
+    segments = pd.DataFrame({"שם עובד": names[shift], "day": day,
+                             "משמרות": (offset == 0).astype('int64'), "סהכ שעות": hours})
+    # השעות של הקטע ביום העבודה: [from_, from_ + hours), וכל דרגה מקבלת את החפיפה שלה עם הטווח
+    from_ = worked_before[shift] + (seg_start - start[shift]) / np.timedelta64(1, 'h')
+    lo = 0.0
+    for label, size in OVERTIME_TIERS:
+        hi = np.inf if size is None else lo + size
+        segments[label] = np.clip(np.minimum(from_ + hours, hi) - np.maximum(from_, lo), 0, None)
+        lo = hi
+    return segments
+
+
+def _worked_before(names, first, start, hours):
+    # שעות שהעובד כבר עבד באותו יום עבודה (יום הכניסה) לפני כל משמרת
+    order = np.lexsort((start, first, names))
+    total = np.cumsum(hours[order])
+    new_day = np.ones(len(order), dtype=bool)
+    new_day[1:] = (names[order][1:] != names[order][:-1]) | (first[order][1:] != first[order][:-1])
+    day_start = np.maximum.accumulate(np.where(new_day, np.arange(len(order)), 0)) if len(order) else order
+    before = total - hours[order] - (total - hours[order])[day_start]
+    result = np.empty(len(order))
+    result[order] = before
+    return result
+
+
+def _sum_by(df, keys):
+    if df.empty:
+        return df
+    return df.groupby(keys, as_index=False, sort=True)[SUM_COLUMNS].sum()
+
+
+def _rows(level, df, period):
+    out = pd.DataFrame({"רמה": level, "שם עובד": df["שם עובד"].to_numpy(), "תקופה": period})
+    for col in SUM_COLUMNS:
+        out[col] = df[col].to_numpy().round(2) if col != "משמרות" else df[col].to_numpy()
+    return out.sort_values(["שם עובד", "תקופה"], kind="stable")
+
+
+def _report_months(start, end):
+    months = sorted(storage.get_available_months())
+    if start is not None:
+        # גם החודש שלפני - משמרת לילה ממנו יכולה ליפול על היום הראשון בטווח
+        first = str(np.datetime64(start, 'M') - 1)
+        months = [m for m in months if m >= first]
+    if end is not None:
+        months = [m for m in months if m <= str(np.datetime64(end, 'M'))]
+    return months
+
+
+def payroll_report(start=None, end=None, workers=None):
+    # start / end: "YYYY-MM-DD" (כולל). מחזיר מנות DataFrame בעמודות REPORT_COLUMNS
+    lo = None if start is None else np.datetime64(start, 'D')
+    hi = None if end is None else np.datetime64(end, 'D')
+    pending_days = None
+    pending_weeks = None
+    months = _report_months(start, end)
+    for i, month in enumerate(months + [None]):
+        if month is not None:
+            df = storage.load_data([month])
+            if workers:
+                df = df[df['שם עובד'].astype(str).str.strip().isin(workers)]
+            segments = split_by_day(df)
+            days = _sum_by(segments, ["שם עובד", "day"])
+            if pending_days is not None:
+                days = _sum_by(pd.concat([pending_days, days], ignore_index=True), ["שם עובד", "day"])
+            boundary = (np.datetime64(month, 'M') + 1).astype('datetime64[D]')
+            ready = days[days["day"] < boundary]
+            pending_days = days[days["day"] >= boundary]
+        else:
+            # סוף הנתונים - כל מה שחיכה יוצא עכשיו
+            if pending_days is None:
+                return
+            ready, boundary = pending_days, None
+
+        if lo is not None:
+            ready = ready[ready["day"] >= lo]
+        if hi is not None:
+            ready = ready[ready["day"] <= hi]
+        day_values = ready["day"].to_numpy().astype('datetime64[D]')
+        if not ready.empty:
+            yield _rows(DAILY, ready, np.datetime_as_string(day_values, unit='D'))
+
+        weeks = ready.assign(week=sunday_of(day_values))[["שם עובד", "week"] + SUM_COLUMNS]
+        weeks = _sum_by(weeks if pending_weeks is None else pd.concat([pending_weeks, weeks], ignore_index=True),
+                        ["שם עובד", "week"])
+        if boundary is not None and not weeks.empty:
+            complete = weeks["week"].to_numpy().astype('datetime64[D]') + np.timedelta64(7, 'D') <= boundary
+            weeks, pending_weeks = weeks[complete], weeks[~complete]
+        if not weeks.empty:
+            yield _rows(WEEKLY, weeks, np.datetime_as_string(weeks["week"].to_numpy().astype('datetime64[D]'), unit='D'))
+
+        months_df = _sum_by(ready.assign(month=np.datetime_as_string(day_values.astype('datetime64[M]'), unit='M'))
+                            [["שם עובד", "month"] + SUM_COLUMNS], ["שם עובד", "month"])
+        if not months_df.empty:
+            yield _rows(MONTHLY, months_df, months_df["month"].to_numpy())
+
+
+# ==========================================
+# כתיבה מצטברת לקובץ
+# ==========================================
+def write_csv(chunks, file):
+    header = True
+    for chunk in chunks:
+        chunk.to_csv(file, index=False, header=header)
+        header = False
+    if header:
+        pd.DataFrame(columns=REPORT_COLUMNS).to_csv(file, index=False)
+
+
+def write_xlsx(chunks, file):
+    # openpyxl במצב write_only כותב כל גיליון לקובץ זמני, בלי להחזיק את כל השורות בזיכרון
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheets = {}
+    for level in LEVELS:
+        sheets[level] = workbook.create_sheet(level)
+        sheets[level].append(REPORT_COLUMNS[1:])
+    for chunk in chunks:
+        for level, part in chunk.groupby("רמה", sort=False):
+            sheet = sheets[level]
+            for row in part[REPORT_COLUMNS[1:]].itertuples(index=False):
+                sheet.append([v.item() if isinstance(v, np.generic) else v for v in row])
+    workbook.save(file)
+
+
+def export(file, fmt="csv", start=None, end=None, workers=None):
+    chunks = payroll_report(start, end, workers)
+    if fmt == "xlsx":
+        write_xlsx(chunks, file)
+    else:
+        # utf-8-sig כדי שאקסל יציג עברית נכון
+        text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+        write_csv(chunks, text)
+        text.flush()
+        text.detach()
+
+
+def report_file(fmt="csv", start=None, end=None, workers=None):
+    # קובץ זמני על הדיסק (לכפתור ההורדה) - מוחזר כשהוא מוכן לקריאה מההתחלה
+    file = tempfile.TemporaryFile()
+    export(file, fmt, start, end, workers)
+    file.seek(0)
+    return file
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ייצוא דו\"ח שכר (CSV / XLSX)")
+    parser.add_argument("--start", default=None, help="YYYY-MM-DD")
+    parser.add_argument("--end", default=None, help="YYYY-MM-DD")
+    parser.add_argument("--worker", action="append", default=None, help="אפשר לחזור כמה פעמים")
+    parser.add_argument("--out", default="payroll.csv", help="סיומת .xlsx לקובץ אקסל")
+    args = parser.parse_args()
+    fmt = "xlsx" if args.out.lower().endswith(".xlsx") else "csv"
+    with open(args.out, 'wb') as out_file:
+        export(out_file, fmt, args.start, args.end, args.worker)
+    print(f"הדו\"ח נשמר ב- {args.out}")
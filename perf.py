@@ -0,0 +1,135 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+
+# ==========================================
+# מדידת זמנים לכל ריצה של הסקריפט, לפי שלב (טעינה, גזירה, סינון, הצגה, שמירה, AI)
+# ==========================================
+# כבוי כברירת מחדל - אז phase() מחזיר אובייקט ריק משותף ואין כמעט עלות.
+# מופעל רק עם ATTENDANCE_PERF=1 בסביבה; ATTENDANCE_PERF_LOG=<קובץ> כותב שורת JSON לכל ריצה.
+PHASES = ["load", "derive", "filter", "render", "persist", "ai"]
+WINDOW = 500
+PERCENTILES = [50, 90, 99]
+ENABLED = os.environ.get("ATTENDANCE_PERF", "") == "1"
+LOG_PATH = os.environ.get("ATTENDANCE_PERF_LOG", "")
+
+# הריצות האחרונות של כל הסשנים בתהליך; הריצה הנוכחית נשמרת לכל thread (כל סשן רץ ב-thread משלו)
+_runs = deque(maxlen=WINDOW)
+_lock = threading.Lock()
+_current = threading.local()
+
+
+class _Noop:
+    __slots__ = ("rows",)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _Noop()
+
+
+class _Timer:
+    __slots__ = ("name", "rows", "start")
+
+    def __init__(self, name, rows):
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        # נרשם גם כשהשלב נקטע (למשל st.rerun אחרי שמירה)
+        ms = (time.perf_counter() - self.start) * 1000
+        run = getattr(_current, "run", None)
+        if run is not None:
+            total_ms, rows = run["phases"].get(self.name, (0.0, None))
+            if self.rows is not None:
+                rows = (rows or 0) + int(self.rows)
+            run["phases"][self.name] = (total_ms + ms, rows)
+        return False
+
+
+def phase(name, rows=None):
+    # with phase("load") as p: df = load_data(); p.rows = len(df)
+    if not ENABLED:
+        return _NOOP
+    return _Timer(name, rows)
+
+
+def start_run(page=""):
+    if not ENABLED:
+        _current.run = None
+        return
+    # ריצה קודמת שנקטעה (st.rerun) עדיין לא נרשמה
+    if getattr(_current, "run", None) is not None:
+        end_run()
+    _current.run = {"ts": datetime.now().isoformat(timespec="seconds"), "page": page,
+                    "start": time.perf_counter(), "phases": {}}
+
+
+def set_page(page):
+    run = getattr(_current, "run", None)
+    if run is not None:
+        run["page"] = page
+
+
+def end_run():
+    run = getattr(_current, "run", None)
+    if run is None:
+        return
+    _current.run = None
+    record = {"ts": run["ts"], "page": run["page"],
+              "total_ms": round((time.perf_counter() - run["start"]) * 1000, 3),
+              "phases": {name: {"ms": round(ms, 3), "rows": rows} for name, (ms, rows) in run["phases"].items()}}
+    with _lock:
+        _runs.append(record)
+        if LOG_PATH:
+            with open(LOG_PATH, 'a', encoding='utf-8') as file:
+                file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def recent_runs():
+    with _lock:
+        return list(_runs)
+
+
+def reset():
+    with _lock:
+        _runs.clear()
+
+
+def summary():
+    # אחוזונים מתגלגלים לכל שלב (ולריצה כולה) על פני WINDOW הריצות האחרונות
+    runs = recent_runs()
+    rows = []
+    for name in PHASES + ["total"]:
+        if name == "total":
+            samples = [(r["total_ms"], None) for r in runs]
+        else:
+            samples = [(r["phases"][name]["ms"], r["phases"][name]["rows"]) for r in runs if name in r["phases"]]
+        if not samples:
+            continue
+        ms = np.array([s[0] for s in samples])
+        counts = [s[1] for s in samples if s[1] is not None]
+        row = {"phase": name, "runs": len(ms)}
+        for p, value in zip(PERCENTILES, np.percentile(ms, PERCENTILES)):
+            row[f"p{p}_ms"] = round(float(value), 2)
+        row["max_ms"] = round(float(ms.max()), 2)
+        row["rows_median"] = int(np.median(counts)) if counts else None
+        rows.append(row)
+    return rows
+
+
+def export_jsonl():
+    return "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in recent_runs())
@@ -0,0 +1,247 @@
+import argparse
+import json
+import re
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+import storage
+
+# ==========================================
+# יבוא מרוכז של החתמות מקוראי כרטיסים / מערכות ישנות
+# ==========================================
+# הקובץ נקרא במנות, כל מנה מוצמדת (כניסה -> יציאה) לכל עובד בצורה וקטורית,
+# וכניסה שעדיין לא נסגרה עוברת למנה הבאה. המנות נאספות בקבצי ביניים ונכנסות בכתיבה אחת.
+# הנחה: ההחתמות של כל עובד מופיעות בקובץ לפי סדר הזמן (כמו ביומן של קורא כרטיסים).
+CHUNK_ROWS = 200_000
+# זוג כניסה/יציאה ארוך מזה הוא כנראה החתמה שנשכחה - לא מייבאים
+MAX_SHIFT_HOURS = 24
+IN_VALUES = ["in", "i", "1", "entry", "כניסה"]
+OUT_VALUES = ["out", "o", "0", "exit", "יציאה"]
+REJECT_SAMPLE = 20
+# ניחוש פורמט הזמן: מדגם מפוזר מהמנה הראשונה; פורמט שמפענח פחות מזה מהמנה - עוצרים
+TIME_SAMPLE = 1000
+MIN_TIME_SHARE = 0.9
+# כשגם יום-חודש וגם חודש-יום מתאימים (כל הימים עד 12) - הסדר המקובל כאן
+PREFERRED_DATE_ORDERS = ["dmY", "Ymd"]
+
+
+class TimeFormatError(ValueError):
+    pass
+
+
+def _new_report():
+    return {"events": 0, "shifts": 0, "imported": 0, "duplicates": 0, "open_shifts": 0,
+            "unknown_worker": 0, "bad_time": 0, "bad_direction": 0, "orphan_exit": 0,
+            "missing_exit": 0, "too_long": 0, "unknown_names": []}
+
+
+def _time_strings(values):
+    # datetime64 -> "YYYY-MM-DD HH:MM" בלי strftime לכל שורה
+    text = np.char.replace(np.datetime_as_string(values.astype("datetime64[m]"), unit="m"), "T", " ")
+    return text.astype(object)
+
+
+def _note_unknown(report, names):
+    if len(report["unknown_names"]) < REJECT_SAMPLE:
+        known = set(report["unknown_names"])
+        extra = [n for n in pd.unique(names) if n not in known]
+        report["unknown_names"] += extra[:REJECT_SAMPLE - len(report["unknown_names"])]
+
+
+def _parse_times(values, formats):
+    # הפורמט הראשון לכל הערכים, והבאים רק למה שעוד לא פוענח (אותו פורמט עם / בלי שניות)
+    times = pd.to_datetime(values, format=formats[0], errors="coerce")
+    for fmt in formats[1:]:
+        missing = times.isna() & values.notna()
+        if not missing.any():
+            break
+        times[missing] = pd.to_datetime(values[missing], format=fmt, errors="coerce")
+    return times
+
+
+def _guess_time_format(values):
+    # הפורמט נקבע פעם אחת לפי המנה הראשונה ומשמש לכל המנות, כדי שהתוצאה לא תלויה בגודל המנה.
+    # מועמדים: מה שהמנחש של pandas מציע לכל ערך במדגם (יום ראשון וגם חודש ראשון), מקובצים
+    # לפי הפורמט בלי שניות; מנצח מי שמפענח הכי הרבה מהמנה. אין הכרעה / מעט מדי מפוענח -> שגיאה
+    values = values.dropna().str.strip()
+    values = values[values != ""]
+    if values.empty:
+        return None
+    positions = np.linspace(0, len(values) - 1, min(len(values), TIME_SAMPLE)).astype(int)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        guesses = {fmt for value in pd.unique(values.iloc[positions]) for dayfirst in (True, False)
+                   if (fmt := guess_datetime_format(value, dayfirst=dayfirst))}
+    # כל פורמט בא יחד עם התאום שלו עם / בלי שניות - גם אם במדגם הופיע רק אחד מהם
+    families = {}
+    for fmt in guesses:
+        base = fmt.replace(":%S", "")
+        families[base] = [base, base.replace("%H:%M", "%H:%M:%S")] if "%H:%M" in base else [base]
+    scores = {}
+    for base, formats in families.items():
+        formats.sort(key=lambda fmt: -pd.to_datetime(values, format=fmt, errors="coerce").notna().sum())
+        scores[base] = int(_parse_times(values, formats).notna().sum())
+    best = max(scores.values(), default=0)
+    top = [base for base, score in scores.items() if score == best]
+    if len(top) > 1:
+        top = [base for base in top if "".join(re.findall(r"%([Ymd])", base)) in PREFERRED_DATE_ORDERS]
+    if best < MIN_TIME_SHARE * len(values):
+        raise TimeFormatError(f"לא נמצא פורמט זמן שמתאים לרוב הערכים (למשל {values.iloc[0]!r}) - "
+                              f"צריך לציין --time-format")
+    if len(top) != 1:
+        raise TimeFormatError(f"פורמט הזמן לא חד-משמעי ({', '.join(sorted(scores))}) - צריך לציין --time-format")
+    return families[top[0]]
+
+
+def read_events(path, roster, report, name_col="שם עובד", time_col="זמן", direction_col=None,
+                time_format=None, chunk_rows=CHUNK_ROWS):
+    # מנות של (שם, זמן, כניסה?) אחרי ניקוי, בדיקת פורמט ובדיקה מול רשימת העובדים
+    usecols = [name_col, time_col] + ([direction_col] if direction_col else [])
+    formats = [time_format] if time_format else None
+    for chunk in pd.read_csv(path, usecols=usecols, dtype=str, chunksize=chunk_rows, encoding='utf-8'):
+        report["events"] += len(chunk)
+        raw = chunk[name_col].fillna("").str.strip()
+        if formats is None:
+            formats = _guess_time_format(chunk[time_col])
+        times = _parse_times(chunk[time_col], formats or [storage.TIME_FMT]).dt.floor("min")
+        ok = times.notna()
+        report["bad_time"] += int((~ok).sum())
+        names = roster.canonical(raw)
+        known = names.notna()
+        unknown = ok & ~known
+        report["unknown_worker"] += int(unknown.sum())
+        if unknown.any():
+            _note_unknown(report, raw[unknown])
+        ok &= known
+        events = pd.DataFrame({"name": names, "time": times})
+        if direction_col:
+            direction = chunk[direction_col].fillna("").str.strip().str.lower()
+            is_in = direction.isin(IN_VALUES)
+            valid = is_in | direction.isin(OUT_VALUES)
+            report["bad_direction"] += int((ok & ~valid).sum())
+            ok &= valid
+            events["is_in"] = is_in
+        yield events[ok]
+
+
+def pair_events(chunks, report, max_hours=MAX_SHIFT_HOURS):
+    # מחזיר מנות של משמרות (שם, כניסה, יציאה, שעות). בלי עמודת כיוון - ההחתמות מתחלפות
+    # כניסה / יציאה לכל עובד, ואז הכניסה שעברה מהמנה הקודמת היא תמיד ההחתמה הראשונה שלו.
+    carry = None
+    for events in chunks:
+        if carry is not None and not carry.empty:
+            events = pd.concat([carry, events], ignore_index=True)
+        events = events.sort_values(["name", "time"], kind="stable").reset_index(drop=True)
+        if "is_in" in events.columns:
+            is_in = events["is_in"].to_numpy(dtype=bool)
+        else:
+            is_in = (events.groupby("name", sort=False).cumcount() % 2 == 0).to_numpy()
+        names = events["name"].to_numpy()
+        same_next = np.zeros(len(events), dtype=bool)
+        same_next[:-1] = names[:-1] == names[1:]
+        next_is_out = np.zeros(len(events), dtype=bool)
+        next_is_out[:-1] = ~is_in[1:]
+        paired = is_in & same_next & next_is_out
+        consumed = np.zeros(len(events), dtype=bool)
+        consumed[1:] = paired[:-1]
+        last_of_worker = ~same_next
+
+        report["orphan_exit"] += int((~is_in & ~consumed).sum())
+        report["missing_exit"] += int((is_in & ~paired & ~last_of_worker).sum())
+        carry = events.loc[is_in & last_of_worker, ["name", "time"] + (["is_in"] if "is_in" in events.columns else [])]
+
+        entry = events["time"].to_numpy()[paired]
+        exit_ = events["time"].to_numpy()[np.flatnonzero(paired) + 1]
+        hours = np.round((exit_ - entry) / np.timedelta64(1, "h"), 2)
+        fits = hours <= max_hours
+        report["too_long"] += int((~fits).sum())
+        if fits.any():
+            yield pd.DataFrame({"שם עובד": names[paired][fits], "כניסה": _time_strings(entry[fits]),
+                                "יציאה": _time_strings(exit_[fits]), "סהכ שעות": hours[fits]})
+
+    if carry is not None and not carry.empty:
+        # כניסה אחרונה בלי יציאה - משמרת פתוחה (אם לעובד אין כבר משמרת פתוחה)
+        report["open_shifts"] += len(carry)
+        yield pd.DataFrame({"שם עובד": carry["name"].to_numpy(), "כניסה": _time_strings(carry["time"].to_numpy()),
+                            "יציאה": np.nan, "סהכ שעות": np.nan}).astype({"יציאה": object})
+
+
+def read_shifts(path, roster, report, chunk_rows=CHUNK_ROWS):
+    # קובץ משמרות מוכן (אותן עמודות כמו attendance.csv ממערכת אחרת) - השעות מחושבות מחדש
+    for chunk in pd.read_csv(path, usecols=["שם עובד", "כניסה", "יציאה"], dtype=str, chunksize=chunk_rows,
+                             encoding='utf-8'):
+        report["events"] += len(chunk)
+        raw = chunk["שם עובד"].fillna("").str.strip()
+        names = roster.canonical(raw)
+        entry = pd.to_datetime(chunk["כניסה"], format=storage.TIME_FMT, errors="coerce")
+        exit_ = pd.to_datetime(chunk["יציאה"], format=storage.TIME_FMT, errors="coerce")
+        ok = entry.notna() & (exit_.notna() | chunk["יציאה"].isna()) & ~(exit_ < entry)
+        report["bad_time"] += int((~ok).sum())
+        unknown = ok & names.isna()
+        report["unknown_worker"] += int(unknown.sum())
+        if unknown.any():
+            _note_unknown(report, raw[unknown])
+        ok &= ~unknown
+        hours = ((exit_ - entry) / pd.Timedelta(hours=1)).round(2)
+        long = ok & (hours > MAX_SHIFT_HOURS)
+        report["too_long"] += int(long.sum())
+        ok &= ~long
+        report["open_shifts"] += int((ok & exit_.isna()).sum())
+        yield pd.DataFrame({"שם עובד": names, "כניסה": chunk["כניסה"], "יציאה": chunk["יציאה"],
+                            "סהכ שעות": hours})[ok]
+
+
+def import_file(path, fmt="events", dry_run=False, **options):
+    # מחזיר דו"ח יבוא. הכתיבה מתבצעת פעם אחת, בסוף, דרך storage.ImportStage
+    start = time.perf_counter()
+    report = _new_report()
+    roster = storage.get_roster()
+    if fmt == "shifts":
+        parts = read_shifts(path, roster, report, options.get("chunk_rows", CHUNK_ROWS))
+    else:
+        max_hours = options.pop("max_hours", MAX_SHIFT_HOURS)
+        parts = pair_events(read_events(path, roster, report, **options), report, max_hours)
+    # כל מנה נכתבת לקבצי ביניים מיד כשהיא מוכנה - הזיכרון תלוי בגודל מנה ולא בגודל הקובץ
+    stage = None if dry_run else storage.ImportStage()
+    try:
+        for part in parts:
+            report["shifts"] += len(part)
+            if stage is not None:
+                stage.add(part)
+        if stage is not None:
+            report["imported"] = stage.commit()
+            report["duplicates"] = report["shifts"] - report["imported"]
+    finally:
+        if stage is not None:
+            stage.close()
+    report["seconds"] = round(time.perf_counter() - start, 3)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="יבוא החתמות מקובץ ייצוא של קורא כרטיסים / מערכת ישנה")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["events", "shifts"], default="events",
+                        help="events: שורה לכל החתמה; shifts: קובץ משמרות בפורמט attendance.csv")
+    parser.add_argument("--name-col", default="שם עובד")
+    parser.add_argument("--time-col", default="זמן")
+    parser.add_argument("--direction-col", default=None, help="עמודת כניסה/יציאה (בלעדיה ההחתמות מתחלפות)")
+    parser.add_argument("--time-format", default=None, help="למשל %%d/%%m/%%Y %%H:%%M:%%S")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--max-hours", type=float, default=MAX_SHIFT_HOURS)
+    parser.add_argument("--dry-run", action="store_true", help="בדיקה בלבד, בלי כתיבה")
+    args = parser.parse_args()
+    try:
+        if args.format == "shifts":
+            result = import_file(args.path, "shifts", args.dry_run, chunk_rows=args.chunk_rows)
+        else:
+            result = import_file(args.path, "events", args.dry_run, name_col=args.name_col, time_col=args.time_col,
+                                 direction_col=args.direction_col, time_format=args.time_format,
+                                 chunk_rows=args.chunk_rows, max_hours=args.max_hours)
+    except TimeFormatError as e:
+        parser.error(str(e))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
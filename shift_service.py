@@ -0,0 +1,211 @@
+import argparse
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import storage
+from storage import ShiftConflict
+
+# ==========================================
+# שירות משמרות: כניסה / יציאה / תיקון - משותף לאפליקציה, לקיוסקים ולקוראי כרטיסים
+# ==========================================
+# שעון ישראל (כמו באפליקציה): UTC+2
+UTC_OFFSET_HOURS = 2
+# אם מוגדר - כל בקשת HTTP חייבת לשלוח אותו בכותרת X-Punch-Token
+PUNCH_TOKEN = os.environ.get("PUNCH_TOKEN", "")
+MAX_BATCH = 1000
+
+
+class PunchError(ValueError):
+    pass
+
+
+def local_now():
+    return datetime.utcnow() + timedelta(hours=UTC_OFFSET_HOURS)
+
+
+def parse_time(value=None):
+    # מחזיר את הזמן בפורמט האחיד של המערכת, או עכשיו אם לא נשלח זמן
+    if value is None or value == "":
+        return local_now().strftime(storage.TIME_FMT)
+    try:
+        return datetime.strptime(str(value).strip(), storage.TIME_FMT).strftime(storage.TIME_FMT)
+    except ValueError:
+        raise PunchError(f"זמן לא תקין: {value} (נדרש {storage.TIME_FMT})")
+
+
+def _allowed_workers():
+    return storage.get_roster()
+
+
+def _check_worker(name, allowed=None):
+    # מחזיר את השם כפי שהוא ברשימת העובדים (גם אם הוקלד בכתיב / ברווחים אחרים)
+    name = str(name).strip()
+    if not name:
+        raise PunchError("חובה להזין מזהה עובד")
+    worker = (allowed if allowed is not None else _allowed_workers()).get(name)
+    if worker is None:
+        raise PunchError(f"{name} אינו מופיע ברשימת העובדים המורשים")
+    return worker
+
+
+def _check_order(entry_str, exit_str):
+    if exit_str < entry_str:
+        raise PunchError(f"זמן היציאה ({exit_str}) מוקדם מזמן הכניסה ({entry_str})")
+
+
+def clock_in(name, at=None):
+    name = _check_worker(name)
+    entry_str = parse_time(at)
+    storage.open_shift(name, entry_str)
+    return entry_str
+
+
+def clock_out(name, at=None, entry=None):
+    # entry: כניסת המשמרת לסגירה; ברירת מחדל - המשמרת הפתוחה של העובד
+    name = str(name).strip()
+    exit_str = parse_time(at)
+    if entry is None:
+        entries = [e for n, e in storage.get_live_stats().open if n == name]
+        if not entries:
+            raise ShiftConflict(f"לעובד {name} אין משמרת פתוחה")
+        entry = entries[-1]
+    _check_order(entry, exit_str)
+    return storage.close_shift(name, entry, exit_str)
+
+
+def correct_shift(name, entry, new_entry, new_exit):
+    new_entry, new_exit = parse_time(new_entry), parse_time(new_exit)
+    _check_order(new_entry, new_exit)
+    return storage.edit_shift(name, entry, new_entry, new_exit)
+
+
+def punch_batch(punches):
+    # punches: [{"name": ..., "at": ...}] - כל החתמה פותחת או סוגרת משמרת (כמו העברת כרטיס).
+    # הבדיקות נעשות כאן, והכתיבה כולה עוברת ב-storage.apply_punches תחת נעילה אחת.
+    allowed = _allowed_workers()
+    results = [None] * len(punches)
+    valid, positions = [], []
+    for pos, item in enumerate(punches):
+        try:
+            if not isinstance(item, dict):
+                raise PunchError("כל החתמה צריכה להיות אובייקט עם name ו-at")
+            valid.append((_check_worker(item.get("name", ""), allowed), parse_time(item.get("at"))))
+            positions.append(pos)
+        except PunchError as e:
+            results[pos] = {"name": str(item.get("name", "")) if isinstance(item, dict) else "", "error": str(e)}
+    for pos, result in zip(positions, storage.apply_punches(valid) if valid else []):
+        results[pos] = result
+    return results
+
+
+def punch(name, at=None):
+    return punch_batch([{"name": name, "at": at}])[0]
+
+
+# החתמות בודדות שמגיעות במקביל (הרבה קוראים בהחלפת משמרת) נאספות למקבץ אחד:
+# הבקשה המובילה כותבת את כל מה שהצטבר בתור וחוזרת מיד עם התוצאה שלה; אם בינתיים הצטברו
+# החתמות חדשות, הראשונה מהן ממשיכה להוביל. השאר רק מחכות לתוצאה שלהן
+_queue = []
+_queue_lock = threading.Lock()
+_flushing = False
+
+
+def punch_coalesced(item):
+    global _flushing
+    slot = {"item": item, "done": threading.Event()}
+    with _queue_lock:
+        _queue.append(slot)
+        leader = not _flushing
+        _flushing = True
+    if not leader:
+        slot["done"].wait()
+        if "result" in slot:
+            return slot["result"]
+    # מובילים: המקבץ כולל תמיד את ההחתמה שלנו (היא עדיין בתור)
+    with _queue_lock:
+        batch = _queue[:]
+        _queue.clear()
+    try:
+        results = punch_batch([s["item"] for s in batch])
+    except Exception as e:
+        results = [{"error": str(e)}] * len(batch)
+    for s, result in zip(batch, results):
+        s["result"] = result
+        if s is not slot:
+            s["done"].set()
+    with _queue_lock:
+        if _queue:
+            # העברת ההובלה - מעירים את הממתינה הראשונה בלי תוצאה
+            _queue[0]["done"].set()
+        else:
+            _flushing = False
+    return slot["result"]
+
+
+# ==========================================
+# נקודת קצה HTTP מקומית (ספריה סטנדרטית בלבד)
+# ==========================================
+# POST /punch   {"name": "...", "at": "YYYY-MM-DD HH:MM"}  או  {"punches": [{...}, ...]}
+# GET  /health
+class PunchHandler(BaseHTTPRequestHandler):
+    def _reply(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/health":
+            return self._reply(404, {"error": "not found"})
+        self._reply(200, {"ok": True, "active": storage.get_live_stats().active_count})
+
+    def do_POST(self):
+        if self.path != "/punch":
+            return self._reply(404, {"error": "not found"})
+        if PUNCH_TOKEN and self.headers.get("X-Punch-Token") != PUNCH_TOKEN:
+            return self._reply(401, {"error": "unauthorized"})
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length).decode('utf-8'))
+        except ValueError:
+            return self._reply(400, {"error": "invalid JSON"})
+        single = isinstance(payload, dict) and "punches" not in payload
+        punches = [payload] if single else payload.get("punches") if isinstance(payload, dict) else None
+        if not isinstance(punches, list) or len(punches) > MAX_BATCH:
+            return self._reply(400, {"error": f"punches must be a list of up to {MAX_BATCH} items"})
+        if single:
+            result = punch_coalesced(payload)
+            return self._reply(422 if "error" in result else 200, result)
+        self._reply(200, {"results": punch_batch(punches)})
+
+    def log_message(self, format, *args):
+        # בלי שורת לוג לכל החתמה - בשעות שיא זה מאט את השרת
+        pass
+
+
+class PunchServer(ThreadingHTTPServer):
+    # תור חיבורים גדול - בהחלפת משמרות הרבה קוראים מתחברים באותה שנייה
+    request_queue_size = 256
+    daemon_threads = True
+
+
+def serve(host="127.0.0.1", port=8765):
+    server = PunchServer((host, port), PunchHandler)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="שירות החתמות לקיוסקים וקוראי כרטיסים")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    print(f"מאזין להחתמות ב- http://{args.host}:{args.port}/punch")
+    serve(args.host, args.port)
@@ -0,0 +1,1503 @@
+import argparse
+import itertools
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unicodedata
+from contextlib import closing, contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# ==========================================
+# שכבת שמירה: קובץ תמונת מצב + יומן אירועים (append-only)
+# ==========================================
+FILE_PATH = "attendance.csv"
+WORKERS_PATH = "workers.csv"
+DB_PATH = os.environ.get("ATTENDANCE_DB", "attendance.db")
+# "csv" (ברירת מחדל), "sqlite" או "parquet"
+BACKEND = os.environ.get("ATTENDANCE_BACKEND", "csv")
+# תיקיית מחיצות חודשיות (קובץ parquet לכל חודש) עבור BACKEND="parquet"
+PARQUET_DIR = os.environ.get("ATTENDANCE_PARQUET_DIR", "attendance_parquet")
+JOURNAL_PATH = "attendance_journal.jsonl"
+COMPACTING_PATH = JOURNAL_PATH + ".compacting"
+# נעילת כתיבה משותפת לכל התהליכים (קיוסקים, סשנים, כלי שורת פקודה)
+LOCK_PATH = "attendance.lock"
+
+# כשהיומן עובר את הגודל הזה (בבתים) הוא מתקפל לתוך attendance.csv
+COMPACT_BYTES = 256 * 1024
+# גודל מנה בקריאה חוזרת של קבצי הביניים של יבוא
+IMPORT_CHUNK_ROWS = 200_000
+
+COLUMNS = ["שם עובד", "כניסה", "יציאה", "סהכ שעות"]
+TIME_FMT = "%Y-%m-%d %H:%M"
+
+
+def calc_hours(entry_str, exit_str):
+    t1 = datetime.strptime(entry_str, TIME_FMT)
+    t2 = datetime.strptime(exit_str, TIME_FMT)
+    return round((t2 - t1).total_seconds() / 3600, 2)
+
+
+def _month_of(entry_str):
+    return datetime.strptime(entry_str, TIME_FMT).strftime("%Y-%m")
+
+
+_MONTH_RE = re.compile(r"\d{4}-\d{2}")
+
+
+def _in_months(df, months):
+    # months: רשימת "YYYY-MM", או None לכל הנתונים
+    if months is None:
+        return df
+    return df[df["כניסה"].astype(str).str[:7].isin(list(months))]
+
+
+def _read_snapshot():
+    if not os.path.exists(FILE_PATH):
+        return pd.DataFrame(columns=COLUMNS)
+    with open(FILE_PATH, 'r', encoding='utf-8') as file:
+        return pd.read_csv(file)
+
+
+def _read_events(path):
+    if not os.path.exists(path):
+        return []
+    events = []
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                # שורה חלקית בסוף היומן (קריסה באמצע כתיבה) - מדלגים
+                continue
+    return events
+
+
+def _read_journal_tail(offset, size):
+    # קריאת האירועים שנוספו ליומן מאז offset - רק שורות שלמות
+    with open(JOURNAL_PATH, 'rb') as file:
+        file.seek(offset)
+        data = file.read(size - offset)
+    consumed = data.rfind(b"\n") + 1
+    events = []
+    for line in data[:consumed].decode('utf-8').splitlines():
+        if line.strip():
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                continue
+    return events, consumed
+
+
+# ==========================================
+# מונים חיים לדשבורד - מתעדכנים בכל פתיחה / סגירה / עריכה ב-O(1)
+# ==========================================
+LONG_SHIFT_HOURS = 9
+
+
+def _hours_value(hours):
+    return 0.0 if pd.isna(hours) else float(hours)
+
+
+class LiveStats:
+    def __init__(self, df=None):
+        self.total_hours = 0.0
+        self.long_shifts = 0
+        # (שם עובד, כניסה) של כל משמרת פתוחה, לפי סדר הפתיחה
+        self.open = {}
+        if df is not None and not df.empty:
+            hours = pd.to_numeric(df["סהכ שעות"], errors="coerce")
+            self.total_hours = float(hours.sum())
+            self.long_shifts = int((hours > LONG_SHIFT_HOURS).sum())
+            open_rows = df[df["יציאה"].isna()]
+            self.open = dict.fromkeys(zip(open_rows["שם עובד"].astype(str).str.strip(), open_rows["כניסה"]))
+
+    @property
+    def active_count(self):
+        return len(self.open)
+
+    def copy(self):
+        other = LiveStats()
+        other.total_hours = self.total_hours
+        other.long_shifts = self.long_shifts
+        other.open = dict(self.open)
+        return other
+
+    def row_changed(self, name, old, new):
+        # old / new: (כניסה, יציאה, סהכ שעות) או None לשורה שלא קיימת
+        for row, sign in ((old, -1), (new, 1)):
+            if row is None:
+                continue
+            entry, exit_, hours = row
+            hours = _hours_value(hours)
+            self.total_hours += sign * hours
+            self.long_shifts += sign * (hours > LONG_SHIFT_HOURS)
+            if pd.isna(exit_):
+                if sign > 0:
+                    self.open[(name, entry)] = None
+                else:
+                    self.open.pop((name, entry), None)
+
+
+# ==========================================
+# המצב המשותף בזיכרון: טבלה + אינדקס (שם עובד, כניסה) -> שורה + מונים חיים
+# ==========================================
+# הפעלה חוזרת אידמפוטנטית: כל אירוע מזוהה לפי (שם עובד, כניסה) ולא לפי מספר שורה,
+# כך שאירוע שכבר נכלל בתמונת המצב (קריסה באמצע קיפול) לא מוחל פעמיים.
+# סגירה / עריכה / שינוי שם נכתבים לשורה במקום (.at); שורות חדשות ומחיקות מחכות בצד
+# ומוחלות על הטבלה רק כשמישהו קורא אותה - כך שהחתמה עולה O(1) בלי קשר לגודל ההיסטוריה.
+class _Attendance:
+    def __init__(self, df):
+        df = df.copy()
+        for col in COLUMNS:
+            if col not in df.columns:
+                df[col] = None
+        to_object = {col: object for col in ("כניסה", "יציאה") if df[col].dtype != object}
+        if to_object:
+            df = df.astype(to_object)
+        if not pd.api.types.is_float_dtype(df["סהכ שעות"]):
+            df["סהכ שעות"] = pd.to_numeric(df["סהכ שעות"], errors="coerce")
+        df = df.reset_index(drop=True)
+        self._df = df
+        self.stats = LiveStats(df)
+        names = df["שם עובד"].astype(str).str.strip().tolist()
+        self.keys = dict(zip(zip(names, df["כניסה"].tolist()), df.index))
+        self.pending = {}
+        self.deleted = []
+        self.next_idx = len(df)
+        self.lock = threading.RLock()
+        # שורות ומספר שינויים לכל חודש - קוביית הסיכומים בונה מחדש רק חודשים שהשתנו
+        months = df["כניסה"].astype(str).str[:7]
+        self.month_rows = months[months.str.fullmatch(r"\d{4}-\d{2}")].value_counts().to_dict()
+        self.month_changes = {}
+        self.generation = next(_generations)
+
+    def _row_changed(self, stats, name, old, new):
+        stats.row_changed(name, old, new)
+        for row, sign in ((old, -1), (new, 1)):
+            if row is None:
+                continue
+            month = str(row[0])[:7]
+            if _MONTH_RE.fullmatch(month):
+                self.month_rows[month] = self.month_rows.get(month, 0) + sign
+                self.month_changes[month] = self.month_changes.get(month, 0) + 1
+
+    def month_versions(self):
+        # {"YYYY-MM": גרסה} לחודשים שיש בהם שורות
+        with self.lock:
+            return {month: (self.generation, self.month_changes.get(month, 0))
+                    for month, count in self.month_rows.items() if count > 0}
+
+    def _get_row(self, idx):
+        if idx in self.pending:
+            row = self.pending[idx]
+            return (row["כניסה"], row["יציאה"], row["סהכ שעות"])
+        return (self._df.at[idx, "כניסה"], self._df.at[idx, "יציאה"], self._df.at[idx, "סהכ שעות"])
+
+    def _set(self, idx, col, value):
+        if idx in self.pending:
+            self.pending[idx][col] = value
+        else:
+            self._df.at[idx, col] = value
+
+    def _set_row(self, stats, idx, name, entry, exit_, hours):
+        old = self._get_row(idx)
+        for col, value in (("כניסה", entry), ("יציאה", exit_), ("סהכ שעות", hours)):
+            self._set(idx, col, value)
+        self._row_changed(stats, name, old, (entry, exit_, hours))
+
+    def apply(self, events):
+        # המונים מוחלפים בעותק (עותק של המשמרות הפתוחות בלבד) - מי שכבר קרא אותם לא רואה חצי עדכון
+        with self.lock:
+            stats = self.stats.copy()
+            for ev in events:
+                self._apply_event(stats, ev)
+            self.stats = stats
+        return self
+
+    def _apply_event(self, stats, ev):
+        name = str(ev.get("name", "")).strip()
+        key = (name, ev.get("in"))
+        op = ev.get("op")
+        keys = self.keys
+        if op in ("open", "add"):
+            if key in keys:
+                return
+            # "add": שורה שלמה שנוספה בעורך; "open": משמרת חדשה בלי יציאה
+            exit_ = ev.get("out")
+            hours = ev.get("hours")
+            idx = self.next_idx
+            self.next_idx += 1
+            self.pending[idx] = {"שם עובד": name, "כניסה": ev["in"],
+                                 "יציאה": float("nan") if exit_ is None else exit_,
+                                 "סהכ שעות": float("nan") if hours is None else hours}
+            self._row_changed(stats, name, None, self._get_row(idx))
+            keys[key] = idx
+        elif op == "close":
+            idx = keys.get(key)
+            if idx is not None:
+                self._set_row(stats, idx, name, ev["in"], ev["out"], ev["hours"])
+        elif op == "edit":
+            idx = keys.pop(key, None)
+            if idx is None:
+                # העריכה כבר הוחלה בתמונת המצב
+                return
+            self._set_row(stats, idx, name, ev["new_in"], ev["out"], ev["hours"])
+            keys[(name, ev["new_in"])] = idx
+        elif op == "rename":
+            idx = keys.pop(key, None)
+            if idx is None:
+                return
+            new_name = str(ev["new_name"]).strip()
+            self._set(idx, "שם עובד", new_name)
+            row = self._get_row(idx)
+            self._row_changed(stats, name, row, None)
+            self._row_changed(stats, new_name, None, row)
+            keys[(new_name, ev["in"])] = idx
+        elif op == "delete":
+            idx = keys.pop(key, None)
+            if idx is None:
+                return
+            self._row_changed(stats, name, self._get_row(idx), None)
+            if idx in self.pending:
+                del self.pending[idx]
+            else:
+                self.deleted.append(idx)
+
+    def frame(self):
+        # הטבלה המלאה; השורות שחיכו בצד מוחלות כאן, פעם אחת לכל קריאה אחרי כתיבה
+        with self.lock:
+            if self.pending or self.deleted:
+                df = self._df.drop(index=self.deleted) if self.deleted else self._df
+                if self.pending:
+                    df = pd.concat([df, pd.DataFrame.from_dict(self.pending, orient="index")])
+                if not pd.api.types.is_float_dtype(df["סהכ שעות"]):
+                    df["סהכ שעות"] = pd.to_numeric(df["סהכ שעות"], errors="coerce")
+                self._df = df
+                self.pending = {}
+                self.deleted = []
+            return self._df
+
+    def read(self, fn):
+        # קריאה עקבית מול כתיבות מקבילות (עדכוני .at נעשים תחת אותה נעילה)
+        with self.lock:
+            return fn(self.frame())
+
+
+_generations = itertools.count()
+
+
+def _replay(df, events):
+    return _Attendance(df).apply(events).frame().reset_index(drop=True)
+
+
+# ==========================================
+# מטמון משותף לכל הסשנים בתהליך (נפסל לפי mtime/גודל של הקבצים)
+# ==========================================
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _file_signature(*paths):
+    sig = []
+    for path in paths:
+        try:
+            st_ = os.stat(path)
+            sig.append((st_.st_ino, st_.st_mtime_ns, st_.st_size))
+        except FileNotFoundError:
+            sig.append(None)
+    return tuple(sig)
+
+
+def _csv_signature():
+    return _file_signature(FILE_PATH, COMPACTING_PATH, JOURNAL_PATH)
+
+
+def _cached(key, sig, loader, copy=True):
+    # מחזירים עותק כדי שאף מסך לא ישנה בטעות את הטבלה המשותפת
+    with _cache_lock:
+        hit = _cache.get(key)
+    if hit is not None and hit[0] == sig:
+        return hit[1].copy() if copy else hit[1]
+    df = loader()
+    with _cache_lock:
+        _cache[key] = (sig, df)
+    return df.copy() if copy else df
+
+
+def _cache_store(key, sig, df):
+    with _cache_lock:
+        _cache[key] = (sig, df)
+
+
+def _cache_update(key, sig_before, sig_after, apply):
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit is not None and hit[0] == sig_before:
+            _cache[key] = (sig_after, apply(hit[1]))
+        else:
+            _cache.pop(key, None)
+
+
+# ==========================================
+# כתיבה אופטימית: נעילת קובץ + בדיקת גרסה
+# ==========================================
+class ShiftConflict(Exception):
+    pass
+
+
+@contextmanager
+def _write_lock():
+    with open(LOCK_PATH, 'a+') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _shift_key(name, entry):
+    return (str(name).strip(), entry)
+
+
+def data_version():
+    # מזהה גרסת הנתונים הנוכחית - משתנה בכל כתיבה מכל תהליך
+    return get_backend().signature()
+
+
+def _write_snapshot(df):
+    tmp_path = FILE_PATH + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as file:
+        df.to_csv(file, index=False)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, FILE_PATH)
+
+
+def _append_event(event):
+    _append_events([event])
+
+
+def _append_events(events):
+    # כמה אירועים בכתיבה אחת ו-fsync אחד (למשל כל השינויים משמירת העורך)
+    line = "".join(json.dumps(event, ensure_ascii=False) + "\n" for event in events)
+    sig_before = _csv_signature()
+    with open(JOURNAL_PATH, 'a', encoding='utf-8') as file:
+        file.write(line)
+        file.flush()
+        os.fsync(file.fileno())
+    sig_after = _csv_signature()
+    # אם רק השורה שלנו נוספה ליומן - מעדכנים את העותק המשותף בזיכרון בלי לקרוא מחדש מהדיסק
+    journal_before = sig_before[2][2] if sig_before[2] else 0
+    if sig_after[2] and sig_after[2][2] == journal_before + len(line.encode('utf-8')):
+        _cache_update("attendance", sig_before, sig_after, lambda state: state.apply(events))
+    if os.path.getsize(JOURNAL_PATH) >= COMPACT_BYTES:
+        compact()
+
+
+def _clean(df):
+    df = df.dropna(subset=['שם עובד', 'כניסה'])
+    df = df[df['שם עובד'].astype(str).str.strip() != '']
+    if 'סהכ שעות' in df.columns:
+        hours = pd.to_numeric(df['סהכ שעות'], errors='coerce')
+        df['סהכ שעות'] = hours.where(hours >= 0, 0)
+    return df
+
+
+def _default_workers():
+    return pd.DataFrame([{"שם עובד": "איתי"}, {"שם עובד": "אורלי"}])
+
+
+def _clean_workers(df):
+    df = df.dropna(subset=['שם עובד'])
+    return df[df['שם עובד'].astype(str).str.strip() != '']
+
+
+# ==========================================
+# אינדקס רשימת העובדים: שם מנורמל -> השם כפי שהוא ברשימה
+# ==========================================
+# נבנה פעם אחת ומוחלף באינדקס חדש בכל שמירה - בדיקת הרשאה היא חיפוש אחד ב-dict, בלי לקרוא
+# את הרשימה מחדש. ההשוואה אחרי NFKC, בלי סימני כיווניות / רווחים בלתי נראים (נדבקים בהעתקה
+# מטקסט עברי), עם רווחים מאוחדים ו-casefold. הנתונים עצמם נשמרים תמיד עם השם שברשימה.
+_INVISIBLE = "[\u200b-\u200f\u202a-\u202e\u2066-\u2069\ufeff]"
+_INVISIBLE_RE = re.compile(_INVISIBLE)
+_SPACES_RE = re.compile(r"\s+")
+
+
+def normalize_name(name):
+    text = _INVISIBLE_RE.sub("", unicodedata.normalize("NFKC", str(name)))
+    return _SPACES_RE.sub(" ", text).strip().casefold()
+
+
+def normalize_names(series):
+    # אותו נרמול כמו normalize_name, וקטורי
+    text = series.astype(str).str.normalize("NFKC").str.replace(_INVISIBLE, "", regex=True)
+    return text.str.replace(r"\s+", " ", regex=True).str.strip().str.casefold()
+
+
+class RosterIndex:
+    def __init__(self, names=()):
+        self.names = self._index(names)
+        self._arrays = None
+
+    @staticmethod
+    def _index(names):
+        names = pd.Series(list(names), dtype=object).astype(str).str.strip()
+        names = names[names != ""]
+        keys = normalize_names(names)
+        first = ~keys.duplicated()
+        return dict(zip(keys[first], names[first]))
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return normalize_name(name) in self.names
+
+    def get(self, name):
+        # השם כפי שהוא ברשימה, או None לעובד שאינו מורשה
+        return self.names.get(normalize_name(name))
+
+    def workers(self):
+        return list(self.names.values())
+
+    def add(self, name):
+        # אינדקס שבמטמון לא משתנה (סשנים אחרים קוראים ממנו במקביל) - מחזירים עותק עם השם הנוסף
+        key = normalize_name(name)
+        if not key or key in self.names:
+            return self
+        index = RosterIndex()
+        index.names = {**self.names, key: str(name).strip()}
+        return index
+
+    def canonical(self, series):
+        # Series של שמות -> השם ברשימה (None למי שאינו מורשה), בלי לולאה בפייתון.
+        # מנרמלים רק את הערכים השונים - בקובץ יבוא יש מעט עובדים והרבה שורות
+        if not self.names:
+            return pd.Series(None, index=series.index, dtype=object)
+        if self._arrays is None:
+            self._arrays = (pd.Index(list(self.names)), np.array(list(self.names.values()), dtype=object))
+        keys, names = self._arrays
+        codes, uniques = pd.factorize(series)
+        pos = keys.get_indexer(normalize_names(pd.Series(uniques, dtype=object)))
+        found = np.where(pos >= 0, names[pos], None)
+        result = np.where(codes >= 0, found[np.maximum(codes, 0)] if len(found) else None, None)
+        return pd.Series(result, index=series.index, dtype=object)
+
+
+# ==========================================
+# רשימת העובדים המורשים ב-workers.csv (משותף ל-CSV ול-Parquet)
+# ==========================================
+class _CsvWorkers:
+    def load_workers(self):
+        if not os.path.exists(WORKERS_PATH):
+            df = _default_workers()
+            self.save_workers(df)
+            return df
+
+        def read():
+            with open(WORKERS_PATH, 'r', encoding='utf-8') as file:
+                return pd.read_csv(file)
+        return _cached("workers", _file_signature(WORKERS_PATH), read)
+
+    def roster(self):
+        if not os.path.exists(WORKERS_PATH):
+            self.load_workers()
+        return _cached("roster", _file_signature(WORKERS_PATH),
+                       lambda: RosterIndex(self.load_workers()['שם עובד']), copy=False)
+
+    def save_workers(self, df):
+        df = _clean_workers(df).reset_index(drop=True)
+        before = _file_signature(WORKERS_PATH)
+        with open(WORKERS_PATH, 'w', encoding='utf-8', newline='') as file:
+            df.to_csv(file, index=False)
+        after = _file_signature(WORKERS_PATH)
+        _cache_store("workers", after, df)
+        _cache_update("roster", before, after, lambda _: RosterIndex(df['שם עובד']))
+
+    def add_worker(self, name):
+        # שורה אחת בסוף הקובץ במקום כתיבה מחדש של כל הרשימה
+        self.load_workers()
+        before = _file_signature(WORKERS_PATH)
+        with open(WORKERS_PATH, 'rb') as file:
+            file.seek(max(0, before[0][2] - 1))
+            ends_with_newline = file.read(1) in (b"", b"\n")
+        row = pd.DataFrame({"שם עובד": [name]})
+        with open(WORKERS_PATH, 'a', encoding='utf-8', newline='') as file:
+            if not ends_with_newline:
+                file.write("\n")
+            row.to_csv(file, index=False, header=False)
+        after = _file_signature(WORKERS_PATH)
+        _cache_update("workers", before, after, lambda df: pd.concat([df, row], ignore_index=True))
+        _cache_update("roster", before, after, lambda index: index.add(name))
+
+
+# ==========================================
+# מימוש CSV: תמונת מצב + יומן
+# ==========================================
+class CsvBackend(_CsvWorkers):
+    def signature(self):
+        return _csv_signature()
+
+    def _load_uncached(self):
+        df = _read_snapshot()
+        events = _read_events(COMPACTING_PATH) + _read_events(JOURNAL_PATH)
+        return _Attendance(df).apply(events)
+
+    def _state(self):
+        # כשתהליך אחר רק הוסיף שורות ליומן - מחילים את הזנב בלבד במקום לקרוא הכל מחדש
+        sig = _csv_signature()
+        with _cache_lock:
+            hit = _cache.get("attendance")
+        if hit is not None and hit[0] != sig:
+            old_sig, state = hit
+            old_journal, journal = old_sig[2], sig[2]
+            if (old_sig[:2] == sig[:2] and old_journal and journal
+                    and old_journal[0] == journal[0] and journal[2] > old_journal[2]):
+                events, consumed = _read_journal_tail(old_journal[2], journal[2])
+                state = state.apply(events)
+                offset = old_journal[2] + consumed
+                new_sig = sig if offset == journal[2] else sig[:2] + ((journal[0], None, offset),)
+                _cache_update("attendance", old_sig, new_sig, lambda _: state)
+                return state
+        return _cached("attendance", sig, self._load_uncached, copy=False)
+
+    def _current(self):
+        return self._state().frame()
+
+    def live_stats(self):
+        return self._state().stats
+
+    def load_data(self, months=None):
+        return self._state().read(lambda df: _in_months(df, months).copy())
+
+    def save_data(self, df):
+        # שמירה מלאה (עורך הנתונים של המנהל) - תמונת המצב החדשה מחליפה גם את היומן
+        df = _clean(df).reset_index(drop=True)
+        _write_snapshot(df)
+        for path in (COMPACTING_PATH, JOURNAL_PATH):
+            if os.path.exists(path):
+                os.remove(path)
+        _cache_store("attendance", _csv_signature(), _Attendance(df))
+
+    def worker_shifts(self, name, months=None):
+        shifts = self._state().read(lambda df: df[df["שם עובד"].astype(str).str.strip() == str(name).strip()])
+        if months is None:
+            return shifts
+        # משמרת פתוחה נשארת גלויה גם אם נפתחה בחודש שלא נבחר
+        return shifts[shifts["כניסה"].astype(str).str[:7].isin(list(months)) | shifts["יציאה"].isna()]
+
+    def available_months(self):
+        return sorted(self._state().month_versions(), reverse=True)
+
+    def month_versions(self):
+        return self._state().month_versions()
+
+    def shift_exists(self, name, entry_str):
+        return (self.worker_shifts(name)["כניסה"] == entry_str).any()
+
+    def open_shift(self, name, entry_str):
+        _append_event({"op": "open", "name": str(name).strip(), "in": entry_str})
+
+    def close_shift(self, name, entry_str, exit_str, hours):
+        _append_event({"op": "close", "name": str(name).strip(), "in": entry_str, "out": exit_str, "hours": hours})
+
+    def apply_punches(self, ops):
+        _append_events(ops)
+
+    def commit_import(self, stage):
+        # תמונת מצב חדשה = הנתונים הנוכחיים + השורות החדשות מהיבוא, נכתבת בזרימה ומוחלפת פעם אחת
+        state = self._state()
+        accept = _ImportFilter(name for name, _ in state.stats.open)
+        tmp_path = FILE_PATH + ".tmp"
+        added = 0
+        with state.lock, open(tmp_path, 'w', encoding='utf-8', newline='') as file:
+            state.frame()[COLUMNS].to_csv(file, index=False)
+            for chunk in stage.chunks():
+                new = accept(chunk, state.keys)
+                new.to_csv(file, index=False, header=False)
+                added += len(new)
+            file.flush()
+            os.fsync(file.fileno())
+        if not added:
+            os.remove(tmp_path)
+            return 0
+        os.replace(tmp_path, FILE_PATH)
+        for path in (COMPACTING_PATH, JOURNAL_PATH):
+            if os.path.exists(path):
+                os.remove(path)
+        # הטבלה המלאה תיקרא מהקובץ החדש בקריאה הבאה
+        with _cache_lock:
+            _cache.pop("attendance", None)
+        return added
+
+    def edit_shift(self, name, entry_str, new_entry_str, new_exit_str, hours):
+        _append_event({"op": "edit", "name": str(name).strip(), "in": entry_str,
+                       "new_in": new_entry_str, "out": new_exit_str, "hours": hours})
+
+    def save_changes(self, deleted, renamed, added):
+        events = [{"op": "delete", "name": name, "in": entry} for name, entry in deleted]
+        events += [{"op": "rename", "name": name, "in": entry, "new_name": new_name}
+                   for (name, entry), new_name in renamed]
+        events += [{"op": "add", **row} for row in added]
+        if events:
+            _append_events(events)
+
+
+def _fold_compacting():
+    df = _replay(_read_snapshot(), _read_events(COMPACTING_PATH))
+    df = _clean(df).reset_index(drop=True)
+    _write_snapshot(df)
+    os.remove(COMPACTING_PATH)
+    return df
+
+
+def compact():
+    # מסובבים את היומן קודם, כך שהחתמות חדשות נכתבות ליומן נקי בזמן הקיפול.
+    # הקיפול כולו רץ תחת _write_lock, אז קובץ .compacting שנשאר הוא מקריסה באמצע קיפול -
+    # מסיימים אותו (ההרצה מחדש אידמפוטנטית) לפני שמסובבים את היומן הנוכחי
+    df = None
+    if os.path.exists(COMPACTING_PATH):
+        df = _fold_compacting()
+    if os.path.exists(JOURNAL_PATH):
+        os.replace(JOURNAL_PATH, COMPACTING_PATH)
+        df = _fold_compacting()
+    if df is not None and not os.path.exists(JOURNAL_PATH):
+        _cache_store("attendance", _csv_signature(), _Attendance(df))
+
+
+# ==========================================
+# מימוש SQLite עם אינדקסים
+# ==========================================
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS shifts (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    entry TEXT NOT NULL,
+    exit TEXT,
+    hours REAL
+);
+CREATE INDEX IF NOT EXISTS idx_shifts_name ON shifts(name, entry);
+CREATE INDEX IF NOT EXISTS idx_shifts_open ON shifts(name) WHERE exit IS NULL;
+CREATE INDEX IF NOT EXISTS idx_shifts_entry ON shifts(entry);
+CREATE TABLE IF NOT EXISTS workers (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_workers_name ON workers(name);
+-- גרסת רשימת העובדים: המטמון של הרשימה לא נפסל בכל החתמה, רק כשהרשימה עצמה משתנה
+CREATE TABLE IF NOT EXISTS roster_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO roster_version VALUES (1, 0);
+CREATE TRIGGER IF NOT EXISTS trg_roster_insert AFTER INSERT ON workers BEGIN
+    UPDATE roster_version SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_roster_delete AFTER DELETE ON workers BEGIN
+    UPDATE roster_version SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_roster_update AFTER UPDATE ON workers BEGIN
+    UPDATE roster_version SET version = version + 1;
+END;
+-- גרסה לכל חודש: קוביית הסיכומים בונה מחדש רק חודשים שהשתנו
+CREATE TABLE IF NOT EXISTS month_versions (
+    month TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO month_versions SELECT DISTINCT substr(entry, 1, 7), 0 FROM shifts;
+CREATE TRIGGER IF NOT EXISTS trg_months_insert AFTER INSERT ON shifts BEGIN
+    INSERT INTO month_versions VALUES (substr(NEW.entry, 1, 7), 1)
+        ON CONFLICT(month) DO UPDATE SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_months_delete AFTER DELETE ON shifts BEGIN
+    UPDATE month_versions SET version = version + 1 WHERE month = substr(OLD.entry, 1, 7);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_months_update AFTER UPDATE ON shifts BEGIN
+    UPDATE month_versions SET version = version + 1 WHERE month = substr(OLD.entry, 1, 7);
+    INSERT INTO month_versions VALUES (substr(NEW.entry, 1, 7), 1)
+        ON CONFLICT(month) DO UPDATE SET version = version + 1;
+END;
+CREATE TABLE IF NOT EXISTS stats (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    total_hours REAL NOT NULL,
+    long_shifts INTEGER NOT NULL
+);
+"""
+
+
+def _stats_triggers():
+    # הסף של משמרת ארוכה נלקח מ-LONG_SHIFT_HOURS, כמו ב-LiveStats
+    long = f"hours > {LONG_SHIFT_HOURS}"
+    return {
+        "trg_stats_insert": f"""CREATE TRIGGER trg_stats_insert AFTER INSERT ON shifts BEGIN
+    UPDATE stats SET total_hours = total_hours + COALESCE(NEW.hours, 0),
+                     long_shifts = long_shifts + COALESCE(NEW.{long}, 0);
+END""",
+        "trg_stats_delete": f"""CREATE TRIGGER trg_stats_delete AFTER DELETE ON shifts BEGIN
+    UPDATE stats SET total_hours = total_hours - COALESCE(OLD.hours, 0),
+                     long_shifts = long_shifts - COALESCE(OLD.{long}, 0);
+END""",
+        "trg_stats_update": f"""CREATE TRIGGER trg_stats_update AFTER UPDATE OF hours ON shifts BEGIN
+    UPDATE stats SET total_hours = total_hours - COALESCE(OLD.hours, 0) + COALESCE(NEW.hours, 0),
+                     long_shifts = long_shifts - COALESCE(OLD.{long}, 0) + COALESCE(NEW.{long}, 0);
+END""",
+    }, f"SELECT 1, COALESCE(SUM(hours), 0), COUNT(CASE WHEN {long} THEN 1 END) FROM shifts"
+
+
+def _current_triggers(conn):
+    return dict(conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_stats_%'"))
+
+
+# מיפוי עמודות הטבלה לשמות העמודות באפליקציה
+_SQL_COLUMNS = "id, name AS 'שם עובד', entry AS 'כניסה', exit AS 'יציאה', hours AS 'סהכ שעות'"
+
+
+def _month_ranges(months):
+    # טווח מחרוזות לכל חודש - כך שהסינון נשען על האינדקס של entry
+    if not months:
+        return "0", []
+    clause = " OR ".join(["(entry >= ? AND entry < ?)"] * len(months))
+    return f"({clause})", [bound for m in months for bound in (m, m + "-99")]
+
+
+class SqliteBackend:
+    def __init__(self, path=None):
+        self.path = path or DB_PATH
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            created = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'workers'").fetchone() is None
+            conn.executescript(_SCHEMA)
+            self._ensure_stats_triggers(conn)
+            # עובדי ברירת המחדל רק כשהמסד נוצר - רשימה שרוקנה בכוונה נשארת ריקה
+            if created:
+                with conn:
+                    conn.executemany("INSERT INTO workers (name) VALUES (?)",
+                                     [(n,) for n in _default_workers()['שם עובד']])
+
+    @staticmethod
+    def _ensure_stats_triggers(conn):
+        # מסד חדש, או שהסף השתנה מאז שהטריגרים נוצרו - בונים אותם מחדש ומחשבים את הסיכום מההתחלה
+        triggers, totals = _stats_triggers()
+        if _current_triggers(conn) == triggers:
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for name in _current_triggers(conn):
+                conn.execute(f"DROP TRIGGER {name}")
+            for sql in triggers.values():
+                conn.execute(sql)
+            conn.execute(f"INSERT OR REPLACE INTO stats {totals}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def _connect(self):
+        # חיבור לכל פעולה - Streamlit מריץ כל סשן ב-thread משלו
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _query(self, where="", params=()):
+        with closing(self._connect()) as conn:
+            df = pd.read_sql_query(f"SELECT {_SQL_COLUMNS} FROM shifts {where}", conn, params=params)
+        return df.set_index("id").rename_axis(None)
+
+    def signature(self):
+        return _file_signature(self.path, self.path + "-wal")
+
+    def load_data(self, months=None):
+        if months is None:
+            return _cached(("attendance", self.path), self.signature(), lambda: self._query("ORDER BY id"))
+        clause, params = _month_ranges(list(months))
+        return self._query(f"WHERE {clause} ORDER BY id", params)
+
+    def save_data(self, df):
+        df = _clean(df)
+        rows = list(zip(df["שם עובד"].astype(str).str.strip(), df["כניסה"],
+                        df["יציאה"].where(df["יציאה"].notna(), None),
+                        df["סהכ שעות"].where(df["סהכ שעות"].notna(), None)))
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM shifts")
+            conn.executemany("INSERT INTO shifts (name, entry, exit, hours) VALUES (?, ?, ?, ?)", rows)
+
+    def worker_shifts(self, name, months=None):
+        if months is None:
+            return self._query("WHERE name = ? ORDER BY id", (str(name).strip(),))
+        clause, params = _month_ranges(list(months))
+        return self._query(f"WHERE name = ? AND ({clause} OR exit IS NULL) ORDER BY id",
+                           [str(name).strip()] + params)
+
+    def available_months(self):
+        def read():
+            with closing(self._connect()) as conn:
+                rows = conn.execute("SELECT DISTINCT substr(entry, 1, 7) FROM shifts ORDER BY 1 DESC").fetchall()
+            return [m for (m,) in rows if len(m) == 7 and m[4] == "-"]
+        return _cached(("months", self.path), self.signature(), read, copy=False)
+
+    def month_versions(self):
+        # המונים מתעדכנים בטריגרים; ה-inode מבדיל בין קובץ DB שהוחלף לבין הקודם
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT month, version FROM month_versions").fetchall()
+        inode = _file_signature(self.path)[0][0]
+        return {month: (inode, version) for month, version in rows if _MONTH_RE.fullmatch(month)}
+
+    def shift_exists(self, name, entry_str):
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT 1 FROM shifts WHERE name = ? AND entry = ? LIMIT 1",
+                               (str(name).strip(), entry_str)).fetchone()
+        return row is not None
+
+    def live_stats(self):
+        # הסכומים נשמרים בטבלת stats ע"י טריגרים; המשמרות הפתוחות נשלפות מהאינדקס החלקי
+        def read():
+            with closing(self._connect()) as conn:
+                total_hours, long_shifts = conn.execute("SELECT total_hours, long_shifts FROM stats").fetchone()
+                open_rows = conn.execute("SELECT name, entry FROM shifts WHERE exit IS NULL ORDER BY id").fetchall()
+            stats = LiveStats()
+            stats.total_hours = total_hours
+            stats.long_shifts = long_shifts
+            stats.open = dict.fromkeys(open_rows)
+            return stats
+        return _cached(("live", self.path), self.signature(), read, copy=False)
+
+    def open_shift(self, name, entry_str):
+        self.apply_punches([{"op": "open", "name": str(name).strip(), "in": entry_str}])
+
+    def close_shift(self, name, entry_str, exit_str, hours):
+        self.apply_punches([{"op": "close", "name": str(name).strip(), "in": entry_str, "out": exit_str, "hours": hours}])
+
+    def apply_punches(self, ops):
+        # כל המקבץ בטרנזקציה אחת, לפי הסדר
+        with closing(self._connect()) as conn, conn:
+            for op in ops:
+                if op["op"] == "open":
+                    conn.execute("INSERT INTO shifts (name, entry) VALUES (?, ?)", (op["name"], op["in"]))
+                else:
+                    conn.execute("UPDATE shifts SET exit = ?, hours = ? WHERE id = "
+                                 "(SELECT id FROM shifts WHERE name = ? AND entry = ? AND exit IS NULL ORDER BY id DESC LIMIT 1)",
+                                 (op["out"], op["hours"], op["name"], op["in"]))
+
+    def edit_shift(self, name, entry_str, new_entry_str, new_exit_str, hours):
+        with closing(self._connect()) as conn, conn:
+            conn.execute("UPDATE shifts SET entry = ?, exit = ?, hours = ? WHERE id = "
+                         "(SELECT id FROM shifts WHERE name = ? AND entry = ? ORDER BY id DESC LIMIT 1)",
+                         (new_entry_str, new_exit_str, hours, str(name).strip(), entry_str))
+
+    def save_changes(self, deleted, renamed, added):
+        target = "(SELECT id FROM shifts WHERE name = ? AND entry = ? ORDER BY id DESC LIMIT 1)"
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(f"DELETE FROM shifts WHERE id = {target}", deleted)
+            conn.executemany(f"UPDATE shifts SET name = ? WHERE id = {target}",
+                             [(new_name, name, entry) for (name, entry), new_name in renamed])
+            conn.executemany("INSERT INTO shifts (name, entry, exit, hours) VALUES (?, ?, ?, ?)",
+                             [(row["name"], row["in"], row["out"], row["hours"]) for row in added])
+
+    def commit_import(self, stage):
+        # טבלת ביניים זמנית + הכנסה אחת בטרנזקציה אחת; הכפילויות מסוננות ב-SQL מול האינדקס (name, entry)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("CREATE TEMP TABLE staged (name TEXT, entry TEXT, exit TEXT, hours REAL, UNIQUE (name, entry))")
+            for chunk in stage.chunks():
+                conn.executemany("INSERT OR IGNORE INTO staged VALUES (?, ?, ?, ?)",
+                                 zip(chunk["שם עובד"], chunk["כניסה"], chunk["יציאה"].where(chunk["יציאה"].notna(), None),
+                                     chunk["סהכ שעות"].where(chunk["סהכ שעות"].notna(), None)))
+            # משמרת פתוחה לעובד שכבר יש לו משמרת פתוחה (או פתוחה שנייה באותו יבוא) לא נכנסת
+            conn.execute("""DELETE FROM staged WHERE exit IS NULL AND (
+                                name IN (SELECT name FROM shifts WHERE exit IS NULL)
+                                OR rowid NOT IN (SELECT MIN(rowid) FROM staged WHERE exit IS NULL GROUP BY name))""")
+            added = conn.execute("""INSERT INTO shifts (name, entry, exit, hours)
+                                    SELECT name, entry, exit, hours FROM staged AS s
+                                    WHERE NOT EXISTS (SELECT 1 FROM shifts WHERE name = s.name AND entry = s.entry)
+                                    ORDER BY rowid""").rowcount
+            conn.execute("DROP TABLE staged")
+        return added
+
+    @staticmethod
+    def _roster_version(conn):
+        return conn.execute("SELECT version FROM roster_version").fetchone()[0]
+
+    def load_workers(self):
+        def read():
+            with closing(self._connect()) as conn:
+                return pd.read_sql_query("SELECT name AS 'שם עובד' FROM workers ORDER BY id", conn)
+        with closing(self._connect()) as conn:
+            version = self._roster_version(conn)
+        return _cached(("workers", self.path), version, read)
+
+    def roster(self):
+        with closing(self._connect()) as conn:
+            version = self._roster_version(conn)
+        return _cached(("roster", self.path), version, lambda: RosterIndex(self.load_workers()['שם עובד']),
+                       copy=False)
+
+    def save_workers(self, df):
+        names = _clean_workers(df)['שם עובד'].astype(str).str.strip()
+        with closing(self._connect()) as conn, conn:
+            before = self._roster_version(conn)
+            conn.execute("DELETE FROM workers")
+            conn.executemany("INSERT INTO workers (name) VALUES (?)", [(n,) for n in names])
+            after = self._roster_version(conn)
+        _cache_update(("workers", self.path), before, after, lambda _: names.rename('שם עובד').to_frame().reset_index(drop=True))
+        _cache_update(("roster", self.path), before, after, lambda _: RosterIndex(names))
+
+    def add_worker(self, name):
+        with closing(self._connect()) as conn, conn:
+            before = self._roster_version(conn)
+            conn.execute("INSERT INTO workers (name) VALUES (?)", (name,))
+            after = self._roster_version(conn)
+        row = pd.DataFrame({"שם עובד": [name]})
+        _cache_update(("workers", self.path), before, after, lambda df: pd.concat([df, row], ignore_index=True))
+        _cache_update(("roster", self.path), before, after, lambda index: index.add(name))
+
+
+# ==========================================
+# מימוש Parquet: מחיצה לכל חודש + manifest.json
+# ==========================================
+# שמות העובדים נשמרים כקטגוריה (dictionary) וזמני כניסה/יציאה כדקות מאז 1970 -
+# כך שקובץ חודש קטן ונקרא מהר, וחודשים ישנים נטענים רק כשמבקשים אותם.
+def _to_minutes(series):
+    parsed = pd.to_datetime(series, format=TIME_FMT, errors="coerce")
+    bad = parsed.isna() & series.notna()
+    if bad.any():
+        raise ValueError(f"זמן לא תקין: {series[bad].iloc[0]}")
+    minutes = parsed.to_numpy().astype("datetime64[m]").astype("int64")
+    return pd.Series(minutes, index=series.index, dtype="Int64").mask(parsed.isna()), parsed
+
+
+def _from_minutes(series):
+    missing = series.isna().to_numpy()
+    minutes = series.fillna(0).to_numpy(dtype="int64").astype("datetime64[m]")
+    text = np.char.replace(np.datetime_as_string(minutes, unit="m"), "T", " ").astype(object)
+    text[missing] = np.nan
+    return pd.Series(text, index=series.index, dtype=object)
+
+
+def _encode(df):
+    entry, _ = _to_minutes(df["כניסה"])
+    exit_, _ = _to_minutes(df["יציאה"])
+    return pd.DataFrame({
+        "name": df["שם עובד"].astype(str).str.strip().astype("category"),
+        "entry": entry,
+        "exit": exit_,
+        "hours": pd.to_numeric(df["סהכ שעות"], errors="coerce").astype(float),
+    })
+
+
+def _decode(table):
+    return pd.DataFrame({
+        "שם עובד": table["name"].astype(str),
+        "כניסה": _from_minutes(table["entry"]),
+        "יציאה": _from_minutes(table["exit"]),
+        "סהכ שעות": table["hours"].astype(float),
+    })
+
+
+def _partition_stats(df):
+    hours = pd.to_numeric(df["סהכ שעות"], errors="coerce")
+    return {"rows": len(df), "hours": float(hours.sum()), "long": int((hours > LONG_SHIFT_HOURS).sum())}
+
+
+def _empty_shifts():
+    return pd.DataFrame({col: pd.Series(dtype=float if col == "סהכ שעות" else object) for col in COLUMNS})
+
+
+class ParquetBackend(_CsvWorkers):
+    def __init__(self, root=None):
+        self.root = root or PARQUET_DIR
+        os.makedirs(self.root, exist_ok=True)
+        self.manifest_path = os.path.join(self.root, "manifest.json")
+
+    def _path(self, month):
+        return os.path.join(self.root, f"{month}.parquet")
+
+    def signature(self):
+        # כל כתיבה מסתיימת בהחלפת ה-manifest, ולכן הוא מייצג את גרסת כל המחיצות
+        return _file_signature(self.manifest_path)
+
+    def _manifest(self):
+        # {"months": {"YYYY-MM": {"rows", "hours", "long"}}, "open": [(שם, כניסה), ...]}
+        def read():
+            if not os.path.exists(self.manifest_path):
+                return {"months": {}, "open": []}
+            with open(self.manifest_path, 'r', encoding='utf-8') as file:
+                manifest = json.load(file)
+            manifest["open"] = [tuple(key) for key in manifest["open"]]
+            return manifest
+        return _cached(("manifest", self.root), self.signature(), read, copy=False)
+
+    def _write_manifest(self, manifest):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(manifest, file, ensure_ascii=False)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.manifest_path)
+        _cache_store(("manifest", self.root), self.signature(), manifest)
+
+    def _partition(self, month):
+        path = self._path(month)
+        if not os.path.exists(path):
+            return _empty_shifts()
+        return _cached(("partition", path), _file_signature(path), lambda: _decode(pd.read_parquet(path)))
+
+    def _write_partition(self, month, df):
+        path = self._path(month)
+        if df.empty:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as file:
+            _encode(df).to_parquet(file, index=False)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+        _cache_store(("partition", path), _file_signature(path), df.reset_index(drop=True))
+
+    def _commit(self, partitions, opened=(), closed=()):
+        # קודם המחיצות ורק בסוף ה-manifest - קורא שרואה manifest חדש רואה גם את המחיצות שלו
+        manifest = self._manifest()
+        months = dict(manifest["months"])
+        for month, df in partitions.items():
+            self._write_partition(month, df)
+            if df.empty:
+                months.pop(month, None)
+            else:
+                months[month] = _partition_stats(df)
+        open_ = [key for key in manifest["open"] if key not in closed] + list(opened)
+        self._write_manifest({"months": months, "open": open_})
+
+    def available_months(self):
+        return sorted(self._manifest()["months"], reverse=True)
+
+    def month_versions(self):
+        return {month: _file_signature(self._path(month)) for month in self._manifest()["months"]}
+
+    def load_data(self, months=None):
+        stored = self._manifest()["months"]
+        selected = sorted(stored if months is None else set(months) & set(stored))
+        frames = [self._partition(m) for m in selected]
+        if not frames:
+            return _empty_shifts()
+        return pd.concat(frames, ignore_index=True)
+
+    def save_data(self, df):
+        df = _clean(df).reset_index(drop=True)
+        _, parsed = _to_minutes(df["כניסה"])
+        _to_minutes(df["יציאה"])
+        months = pd.Series(np.datetime_as_string(parsed.to_numpy().astype("datetime64[M]"), unit="M"), index=df.index)
+        partitions = {month: df.loc[idx].reset_index(drop=True) for month, idx in df.groupby(months).groups.items()}
+        for month in self._manifest()["months"]:
+            partitions.setdefault(month, _empty_shifts())
+        open_rows = df[df["יציאה"].isna()]
+        manifest = self._manifest()
+        self._commit(partitions, opened=list(zip(open_rows["שם עובד"].astype(str).str.strip(), open_rows["כניסה"])),
+                     closed=set(manifest["open"]))
+
+    def worker_shifts(self, name, months=None):
+        name = str(name).strip()
+        if months is not None:
+            # המשמרות הפתוחות ידועות מה-manifest, כך שנטען גם את החודש שלהן בלבד
+            open_months = {_month_of(entry) for n, entry in self._manifest()["open"] if n == name}
+            df = self.load_data(set(months) | open_months)
+            df = df[df["כניסה"].str[:7].isin(list(months)) | df["יציאה"].isna()]
+        else:
+            df = self.load_data()
+        return df[df["שם עובד"] == name]
+
+    def live_stats(self):
+        def read():
+            manifest = self._manifest()
+            stats = LiveStats()
+            stats.total_hours = sum(m["hours"] for m in manifest["months"].values())
+            stats.long_shifts = sum(m["long"] for m in manifest["months"].values())
+            stats.open = dict.fromkeys(manifest["open"])
+            return stats
+        return _cached(("live", self.root), self.signature(), read, copy=False)
+
+    def shift_exists(self, name, entry_str):
+        df = self._partition(_month_of(entry_str))
+        return ((df["שם עובד"] == str(name).strip()) & (df["כניסה"] == entry_str)).any()
+
+    def _find(self, df, name, entry_str, open_only=False):
+        mask = (df["שם עובד"] == name) & (df["כניסה"] == entry_str)
+        if open_only:
+            mask &= df["יציאה"].isna()
+        hits = df.index[mask]
+        return hits[-1] if len(hits) else None
+
+    def open_shift(self, name, entry_str):
+        self.apply_punches([{"op": "open", "name": str(name).strip(), "in": entry_str}])
+
+    def close_shift(self, name, entry_str, exit_str, hours):
+        self.apply_punches([{"op": "close", "name": str(name).strip(), "in": entry_str, "out": exit_str, "hours": hours}])
+
+    def apply_punches(self, ops):
+        # כל מחיצה שנגעו בה נכתבת פעם אחת, וה-manifest פעם אחת לכל המקבץ.
+        # משמרות שנפתחו במקבץ נאספות בצד ומצורפות למחיצה בסוף, בלי concat לכל החתמה.
+        partitions, pending, opened, closed = {}, {}, {}, set()
+        for op in ops:
+            month = _month_of(op["in"])
+            if month not in partitions:
+                partitions[month] = self._partition(month)
+                pending[month] = []
+            key = (op["name"], op["in"])
+            if op["op"] == "open":
+                row = {"שם עובד": op["name"], "כניסה": op["in"], "יציאה": np.nan, "סהכ שעות": np.nan}
+                pending[month].append(row)
+                opened[key] = row
+                continue
+            if key in opened:
+                row = opened.pop(key)
+                row["יציאה"], row["סהכ שעות"] = op["out"], op["hours"]
+                continue
+            df = partitions[month]
+            idx = self._find(df, op["name"], op["in"], open_only=True)
+            if idx is None:
+                continue
+            df.loc[idx, ["יציאה", "סהכ שעות"]] = [op["out"], op["hours"]]
+            closed.add(key)
+        for month, rows in pending.items():
+            if rows:
+                added = pd.DataFrame(rows, columns=COLUMNS).astype({"כניסה": object, "יציאה": object})
+                partitions[month] = pd.concat([partitions[month], added], ignore_index=True)
+        self._commit(partitions, opened=list(opened), closed=closed)
+
+    def edit_shift(self, name, entry_str, new_entry_str, new_exit_str, hours):
+        name = str(name).strip()
+        month, new_month = _month_of(entry_str), _month_of(new_entry_str)
+        df = self._partition(month)
+        idx = self._find(df, name, entry_str)
+        if idx is None:
+            return
+        was_open = pd.isna(df.at[idx, "יציאה"])
+        if new_month == month:
+            df.loc[idx, ["כניסה", "יציאה", "סהכ שעות"]] = [new_entry_str, new_exit_str, hours]
+            partitions = {month: df}
+        else:
+            # המשמרת עוברת חודש - יוצאת ממחיצה אחת ונכנסת לאחרת
+            moved = pd.DataFrame({"שם עובד": [name], "כניסה": [new_entry_str], "יציאה": [new_exit_str],
+                                  "סהכ שעות": [hours]}).astype({"כניסה": object, "יציאה": object})
+            partitions = {month: df.drop(index=idx).reset_index(drop=True),
+                          new_month: pd.concat([self._partition(new_month), moved], ignore_index=True)}
+        self._commit(partitions, closed={(name, entry_str)} if was_open else ())
+
+    def commit_import(self, stage):
+        # חודש אחרי חודש: רק מחיצה אחת בזיכרון בכל רגע; ה-manifest נכתב פעם אחת בסוף
+        manifest = self._manifest()
+        months = dict(manifest["months"])
+        accept = _ImportFilter(name for name, _ in manifest["open"])
+        opened, added = [], 0
+        for month in stage.months():
+            current = self._partition(month)
+            existing = set(zip(current["שם עובד"].astype(str), current["כניסה"]))
+            new = [part for part in (accept(chunk, existing) for chunk in stage.chunks(month)) if not part.empty]
+            if not new:
+                continue
+            df = pd.concat([current] + new, ignore_index=True)
+            self._write_partition(month, df)
+            months[month] = _partition_stats(df)
+            for part in new:
+                open_rows = part[part["יציאה"].isna()]
+                opened += list(zip(open_rows["שם עובד"], open_rows["כניסה"]))
+                added += len(part)
+        if added:
+            self._write_manifest({"months": months, "open": manifest["open"] + opened})
+        return added
+
+    def save_changes(self, deleted, renamed, added):
+        # רק המחיצות של החודשים שהשינויים נוגעים בהם נקראות ונכתבות מחדש
+        partitions, drops, opened, closed = {}, {}, [], set()
+
+        def partition(month):
+            if month not in partitions:
+                partitions[month] = self._partition(month)
+            return partitions[month]
+
+        for (name, entry), new_name in [(key, None) for key in deleted] + list(renamed):
+            month = _month_of(entry)
+            df = partition(month)
+            idx = self._find(df, name, entry)
+            if idx is None or idx in drops.get(month, ()):
+                continue
+            if pd.isna(df.at[idx, "יציאה"]):
+                closed.add((name, entry))
+                if new_name is not None:
+                    opened.append((new_name, entry))
+            if new_name is None:
+                drops.setdefault(month, []).append(idx)
+            else:
+                df.at[idx, "שם עובד"] = new_name
+        for row in added:
+            month = _month_of(row["in"])
+            new = pd.DataFrame({"שם עובד": [row["name"]], "כניסה": [row["in"]],
+                                "יציאה": [np.nan if row["out"] is None else row["out"]],
+                                "סהכ שעות": [np.nan if row["hours"] is None else row["hours"]]})
+            partitions[month] = pd.concat([partition(month), new.astype({"כניסה": object, "יציאה": object})],
+                                          ignore_index=True)
+            if row["out"] is None:
+                opened.append((row["name"], row["in"]))
+        if partitions:
+            self._commit({month: df.drop(index=drops.get(month, [])).reset_index(drop=True)
+                          for month, df in partitions.items()}, opened=opened, closed=closed)
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = {"sqlite": SqliteBackend, "parquet": ParquetBackend}.get(BACKEND, CsvBackend)()
+    return _backend
+
+
+# ==========================================
+# ממשק הפונקציות של האפליקציה - מועבר למימוש הפעיל
+# ==========================================
+def load_data(months=None):
+    # months: רשימת חודשים ("YYYY-MM") לטעינה, או None לכל הנתונים
+    return get_backend().load_data(months)
+
+
+def get_month_versions():
+    # {"YYYY-MM": גרסה} - משתנה רק כשמשמרת באותו חודש נוספה / השתנתה / נמחקה
+    return get_backend().month_versions()
+
+
+def get_available_months():
+    return get_backend().available_months()
+
+
+def save_data(df):
+    with _write_lock():
+        get_backend().save_data(df)
+
+
+def save_changes(deleted=(), renamed=(), added=None):
+    # שמירת השינויים בלבד מהעורך, לפי מפתח המשמרת (שם עובד, כניסה):
+    # deleted - מפתחות למחיקה, renamed - (מפתח, שם חדש), added - טבלת שורות חדשות.
+    # שורה שנמחקה / השתנתה בינתיים ע"י מישהו אחר פשוט מדולגת.
+    deleted = [_shift_key(name, entry) for name, entry in deleted]
+    renames = []
+    for (name, entry), new_name in renamed:
+        if pd.isna(new_name) or not str(new_name).strip():
+            # שם ריק נמחק, בדיוק כמו בשמירה מלאה
+            deleted.append(_shift_key(name, entry))
+        else:
+            renames.append((_shift_key(name, entry), str(new_name).strip()))
+    rows = []
+    if added is not None and not added.empty:
+        added = _clean(added.reindex(columns=COLUMNS))
+        for name, entry, exit_, hours in zip(added["שם עובד"], added["כניסה"], added["יציאה"], added["סהכ שעות"]):
+            rows.append({"name": str(name).strip(), "in": entry,
+                         "out": None if pd.isna(exit_) else exit_, "hours": None if pd.isna(hours) else float(hours)})
+    with _write_lock():
+        get_backend().save_changes(deleted, renames, rows)
+
+
+# ==========================================
+# יבוא גדול: מנות נכתבות לקבצי ביניים (לפי חודש) ונכנסות בכתיבה אחת
+# ==========================================
+class _ImportFilter:
+    # משמרת שכבר קיימת (שם עובד + כניסה) או שכבר הופיעה ביבוא, או משמרת פתוחה לעובד שכבר יש לו
+    # משמרת פתוחה - מדולגת. existing: אינדקס המפתחות של הנתונים הקיימים (dict / set של (שם, כניסה))
+    def __init__(self, open_names):
+        self.open_names = set(open_names)
+        self.seen = set()
+
+    def __call__(self, chunk, existing):
+        keep = np.zeros(len(chunk), dtype=bool)
+        for pos, (name, entry, is_open) in enumerate(zip(chunk["שם עובד"], chunk["כניסה"], chunk["יציאה"].isna())):
+            key = (name, entry)
+            if key in existing or key in self.seen or (is_open and name in self.open_names):
+                continue
+            self.seen.add(key)
+            if is_open:
+                self.open_names.add(name)
+            keep[pos] = True
+        return chunk[keep]
+
+
+class ImportStage:
+    def __init__(self):
+        self.dir = tempfile.mkdtemp(prefix="attendance_import_")
+        self.rows = 0
+
+    def add(self, df):
+        df = _clean(df.reindex(columns=COLUMNS)).reset_index(drop=True)
+        df["שם עובד"] = df["שם עובד"].astype(str).str.strip()
+        for month, part in df.groupby(df["כניסה"].astype(str).str[:7], sort=False):
+            path = os.path.join(self.dir, f"{month}.csv")
+            part.to_csv(path, mode='a', header=not os.path.exists(path), index=False, encoding='utf-8')
+        self.rows += len(df)
+
+    def months(self):
+        return sorted(name[:-4] for name in os.listdir(self.dir))
+
+    def chunks(self, month=None):
+        for m in [month] if month is not None else self.months():
+            yield from pd.read_csv(os.path.join(self.dir, f"{m}.csv"), dtype={col: str for col in COLUMNS[:3]},
+                                   keep_default_na=False, na_values={"יציאה": [""], "סהכ שעות": [""]},
+                                   chunksize=IMPORT_CHUNK_ROWS, encoding='utf-8')
+
+    def commit(self):
+        # מחזיר את מספר המשמרות שנוספו
+        if not self.rows:
+            return 0
+        with _write_lock():
+            return get_backend().commit_import(self)
+
+    def close(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+def get_worker_shifts(name, months=None):
+    return get_backend().worker_shifts(name, months)
+
+
+def get_live_stats():
+    return get_backend().live_stats()
+
+
+def open_shift(name, entry_str):
+    with _write_lock():
+        if any(n == str(name).strip() for n, _ in get_backend().live_stats().open):
+            raise ShiftConflict(f"לעובד {str(name).strip()} כבר יש משמרת פתוחה")
+        get_backend().open_shift(name, entry_str)
+
+
+def close_shift(name, entry_str, exit_str):
+    hours = calc_hours(entry_str, exit_str)
+    with _write_lock():
+        if (str(name).strip(), entry_str) not in get_backend().live_stats().open:
+            raise ShiftConflict(f"המשמרת של {str(name).strip()} מ- {entry_str} כבר נסגרה")
+        get_backend().close_shift(name, entry_str, exit_str, hours)
+    return hours
+
+
+def apply_punches(punches):
+    # punches: [(שם עובד, זמן)] - כל החתמה פותחת משמרת אם אין לעובד משמרת פתוחה, ואחרת סוגרת אותה.
+    # המקבץ כולו נבדק ונכתב תחת נעילה אחת ובכתיבה אחת; מחזיר תוצאה לכל החתמה לפי הסדר.
+    results, ops = [], []
+    with _write_lock():
+        backend = get_backend()
+        open_entry = {name: entry for name, entry in backend.live_stats().open}
+        for name, at in punches:
+            name = str(name).strip()
+            entry = open_entry.get(name)
+            if entry is None:
+                ops.append({"op": "open", "name": name, "in": at})
+                open_entry[name] = at
+                results.append({"name": name, "action": "in", "entry": at})
+                continue
+            if at == entry:
+                # העברת כרטיס כפולה באותה דקה
+                results.append({"name": name, "action": "duplicate", "entry": entry})
+                continue
+            hours = calc_hours(entry, at)
+            if hours < 0:
+                results.append({"name": name, "error": f"זמן היציאה {at} מוקדם מזמן הכניסה {entry}"})
+                continue
+            ops.append({"op": "close", "name": name, "in": entry, "out": at, "hours": hours})
+            del open_entry[name]
+            results.append({"name": name, "action": "out", "entry": entry, "exit": at, "hours": hours})
+        if ops:
+            backend.apply_punches(ops)
+    return results
+
+
+def edit_shift(name, entry_str, new_entry_str, new_exit_str):
+    hours = calc_hours(new_entry_str, new_exit_str)
+    with _write_lock():
+        if not get_backend().shift_exists(name, entry_str):
+            raise ShiftConflict(f"המשמרת של {str(name).strip()} מ- {entry_str} השתנתה בינתיים")
+        get_backend().edit_shift(name, entry_str, new_entry_str, new_exit_str, hours)
+    return hours
+
+
+def load_workers():
+    return get_backend().load_workers()
+
+
+def save_workers(df):
+    with _write_lock():
+        get_backend().save_workers(df)
+
+
+def get_roster():
+    # אינדקס הרשימה (משותף - לא לשנות ישירות; שינויים דרך save_workers / add_worker)
+    return get_backend().roster()
+
+
+def add_worker(name):
+    # מחזיר את השם שנוסף, או None אם העובד כבר ברשימה (גם בכתיב אחר של אותו שם)
+    name = str(name).strip()
+    if not normalize_name(name):
+        raise ValueError("חובה להזין שם עובד")
+    with _write_lock():
+        if name in get_backend().roster():
+            return None
+        get_backend().add_worker(name)
+    return name
+
+
+# ==========================================
+# הסבה חד-פעמית: CSV -> SQLite / Parquet
+# ==========================================
+def migrate_csv_to_sqlite(db_path=None):
+    source = CsvBackend()
+    target = SqliteBackend(db_path)
+    shifts = source.load_data()
+    target.save_data(shifts)
+    target.save_workers(source.load_workers())
+    return len(shifts)
+
+
+def migrate_csv_to_parquet(root=None):
+    # workers.csv נשאר במקומו - ה-Parquet משתמש באותה רשימת עובדים
+    source = CsvBackend()
+    shifts = source.load_data()
+    ParquetBackend(root).save_data(shifts)
+    return len(shifts)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="כלי שמירה של מערכת השעות")
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate = sub.add_parser("migrate", help="העברת attendance.csv (ו-workers.csv) ל-SQLite או למחיצות Parquet")
+    migrate.add_argument("--to", choices=["sqlite", "parquet"], default="sqlite")
+    migrate.add_argument("--db", default=DB_PATH)
+    migrate.add_argument("--dir", default=PARQUET_DIR)
+    args = parser.parse_args()
+    if args.command == "migrate":
+        if args.to == "parquet":
+            count = migrate_csv_to_parquet(args.dir)
+            print(f"הועברו {count} משמרות אל {args.dir}. הפעל עם ATTENDANCE_BACKEND=parquet.")
+        else:
+            count = migrate_csv_to_sqlite(args.db)
+            print(f"הועברו {count} משמרות אל {args.db}. הפעל עם ATTENDANCE_BACKEND=sqlite.")
@@ -0,0 +1,141 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import storage
+
+# ==========================================
+# מבחן עומס: החתמות מקבילות מהרבה "קיוסקים" - אף החתמה לא אמורה ללכת לאיבוד
+# ==========================================
+BASE_TIME = datetime(2026, 1, 4, 6, 0)
+
+
+def _setup(work_dir, backend, compact_bytes):
+    os.chdir(work_dir)
+    storage.BACKEND = backend
+    storage.COMPACT_BYTES = compact_bytes
+    storage._backend = None
+
+
+def _kiosk(proc_id, thread_id, workers, cycles):
+    punches = 0
+    for cycle in range(cycles):
+        entry = BASE_TIME + timedelta(days=cycle)
+        for w in range(workers):
+            name = f"עובד-{proc_id}-{thread_id}-{w}"
+            entry_str = entry.strftime(storage.TIME_FMT)
+            exit_str = (entry + timedelta(hours=8, minutes=w)).strftime(storage.TIME_FMT)
+            storage.open_shift(name, entry_str)
+            storage.close_shift(name, entry_str, exit_str)
+            punches += 2
+    return punches
+
+
+def _editor(proc_id, stop):
+    # מנהל ששומר את עורך הנתונים שוב ושוב בזמן שהקיוסקים מחתימים - דרך save_changes, כמו האפליקציה:
+    # שורה חדשה, שינוי שם שלה ומחיקה שלה (בסוף אין שורות עודפות, אז ספירת המשמרות נשארת מדויקת)
+    saves = 0
+    while not stop.is_set():
+        name = f"מנהל-{proc_id}-{saves}"
+        entry = (BASE_TIME - timedelta(days=1, minutes=saves)).strftime(storage.TIME_FMT)
+        exit_ = (BASE_TIME - timedelta(minutes=saves)).strftime(storage.TIME_FMT)
+        storage.save_changes(added=pd.DataFrame([{"שם עובד": name, "כניסה": entry, "יציאה": exit_, "סהכ שעות": 24.0}]))
+        storage.save_changes(renamed=[((name, entry), name + "-שונה")])
+        storage.save_changes(deleted=[(name + "-שונה", entry)])
+        saves += 3
+        time.sleep(0.01)
+    return saves
+
+
+def _run_process(args):
+    proc_id, work_dir, backend, compact_bytes, threads, workers, cycles, editor = args
+    _setup(work_dir, backend, compact_bytes)
+    results = [0] * threads
+    errors = []
+
+    def run(thread_id):
+        try:
+            results[thread_id] = _kiosk(proc_id, thread_id, workers, cycles)
+        except Exception as e:
+            errors.append(repr(e))
+
+    stop = threading.Event()
+    editor_saves = []
+    editor_thread = None
+
+    def edit():
+        try:
+            editor_saves.append(_editor(proc_id, stop))
+        except Exception as e:
+            errors.append(repr(e))
+
+    if editor:
+        editor_thread = threading.Thread(target=edit)
+        editor_thread.start()
+    pool = [threading.Thread(target=run, args=(t,)) for t in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    stop.set()
+    if editor_thread is not None:
+        editor_thread.join()
+    return sum(results), sum(editor_saves), errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="מבחן עומס להחתמות מקבילות")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=5, help="עובדים לכל thread")
+    parser.add_argument("--cycles", type=int, default=10, help="משמרות לכל עובד")
+    parser.add_argument("--backend", choices=["csv", "sqlite", "parquet"], default="csv")
+    parser.add_argument("--compact-bytes", type=int, default=64 * 1024)
+    parser.add_argument("--editor", action="store_true", help="מנהל ששומר את העורך במקביל בכל תהליך")
+    parser.add_argument("--dir", default=None, help="תיקיית עבודה (ברירת מחדל: תיקייה זמנית)")
+    args = parser.parse_args()
+
+    work_dir = args.dir or tempfile.mkdtemp(prefix="stress_punches_")
+    _setup(work_dir, args.backend, args.compact_bytes)
+    storage.save_data(storage.load_data().iloc[0:0])
+
+    jobs = [(p, work_dir, args.backend, args.compact_bytes, args.threads, args.workers, args.cycles, args.editor)
+            for p in range(args.processes)]
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.processes) as pool:
+        results = pool.map(_run_process, jobs)
+    elapsed = time.perf_counter() - start
+
+    punches = sum(r[0] for r in results)
+    errors = [e for r in results for e in r[2]]
+    expected_shifts = args.processes * args.threads * args.workers * args.cycles
+    df = storage.load_data()
+    closed = df[df["יציאה"].notna()]
+    report = {
+        "backend": args.backend,
+        "dir": work_dir,
+        "punches": punches,
+        "seconds": round(elapsed, 3),
+        "punches_per_second": round(punches / elapsed, 1) if elapsed else None,
+        "editor_saves": sum(r[1] for r in results),
+        "expected_shifts": expected_shifts,
+        "stored_shifts": len(df),
+        "closed_shifts": len(closed),
+        "lost": expected_shifts - len(closed),
+        "errors": errors[:10],
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0 if report["lost"] == 0 and len(df) == expected_shifts and not errors else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())